@@ -0,0 +1,36 @@
+"""
+Benchmark suite for keybin over synthetic vaults.
+
+Creates throwaway profiles in a temp directory with an in-memory session store, fills them with 1k/10k/100k
+logs (encrypted and not) and times login, add, delete, exact filters and fuzzy search. Same as
+`keybin bench`, see keybin/bench.py.
+
+    python benchmarks/run.py [--sizes 1000,10000] [--repeat 5] [--json out.json] [--compare old.json]
+"""
+import argparse
+from keybin.bench import DEFAULT_SIZES, runBenchmarks, printResults, saveResults, loadResults
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma separated vault sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per operation")
+    parser.add_argument("--storage", default="file", help="Storage backends, comma separated (file, journal)")
+    parser.add_argument("--json", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    args = parser.parse_args()
+    
+    baseline = loadResults(args.compare) if args.compare else None
+    results = runBenchmarks(
+        [int(size) for size in args.sizes.split(",")],
+        storages=tuple(args.storage.split(",")),
+        repeat=args.repeat,
+        progress=lambda size, encrypted, storage: print(f"Benchmarking {size} logs ({'encrypted' if encrypted else 'not encrypted'}, {storage})..."),
+    )
+    printResults(results, baseline)
+    if args.json:
+        saveResults(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
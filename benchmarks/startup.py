@@ -0,0 +1,56 @@
+"""
+Startup time check for the keybin CLI.
+
+Runs `python -X importtime` on the CLI entry point and fails if importing it takes longer than the
+budget, or if the modules that only session commands need get imported at startup.
+
+    python benchmarks/startup.py [--budget-ms 150] [--runs 5]
+"""
+import argparse, re, subprocess, sys
+
+## lo que solo necesitan los comandos con sesion, genpass/--help no deberian cargarlo
+HEAVY_MODULES = ("keybin.core", "keyring", "cryptography", "pydantic", "thefuzz", "rapidfuzz", "platformdirs", "rich.console", "pyperclip")
+ENTRY_POINT = "keybin.cli"
+
+
+def importTimes():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {ENTRY_POINT}"],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.+)$", line)
+        if match:
+            times[match.group(2).strip()] = int(match.group(1))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=150, help="Max cumulative import time of the CLI entry point")
+    parser.add_argument("--runs", type=int, default=5, help="Runs to take the best of, the first one warms the bytecode cache")
+    args = parser.parse_args()
+    
+    runs = [importTimes() for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times[ENTRY_POINT])
+    totalMs = best[ENTRY_POINT] / 1000
+    
+    failed = False
+    print(f"import {ENTRY_POINT}: {totalMs:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if totalMs > args.budget_ms:
+        failed = True
+        slowest = sorted(best.items(), key=lambda item: item[1], reverse=True)[1:11]
+        print("Over budget, slowest imports:")
+        for module, micros in slowest:
+            print(f"  {micros / 1000:8.1f} ms  {module}")
+    
+    eager = [module for module in best if module.split(".")[0] in HEAVY_MODULES or module in HEAVY_MODULES]
+    if eager:
+        failed = True
+        print("Imported at startup but should be lazy: " + ", ".join(sorted(eager)))
+    
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+## Vault y AsyncVault se importan recien cuando se usan, asi `import keybin.cli` no carga cryptography y compania
+
+
+def __getattr__(name):
+    if name == "Vault":
+        from keybin.vault import Vault
+        return Vault
+    if name == "AsyncVault":
+        from keybin.asyncvault import AsyncVault
+        return AsyncVault
+    raise AttributeError(f"module 'keybin' has no attribute '{name}'")
+
+__all__ = ["Vault", "AsyncVault"]
@@ -0,0 +1,239 @@
+import json, os, socket, struct, subprocess, sys, time
+from pathlib import Path
+from keybin import exceptions
+from keybin.exceptions import KeybinError, AgentError
+
+AGENT_TIMEOUT = 5 ## segundos que se espera al agent en cada pedido
+AGENT_ENABLED = True ## los benchmarks lo apagan para no hablarle al agent real del usuario
+_isAgent = False ## True adentro del proceso del agent, para que no se hable a si mismo
+
+
+def getSocketPath():
+    from platformdirs import user_runtime_dir
+    return Path(user_runtime_dir("keybin")).joinpath("agent.sock")
+
+def _connect():
+    """
+    Returns a socket connected to the agent, or None if there's no agent listening.
+    """
+    if _isAgent or not AGENT_ENABLED or not hasattr(socket, "AF_UNIX"):
+        return None
+    path = getSocketPath()
+    if not path.exists():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(AGENT_TIMEOUT)
+    try:
+        client.connect(str(path))
+    except OSError: ## socket viejo de un agent que ya no esta
+        client.close()
+        return None
+    return client
+
+def _exchange(client : socket.socket, request : dict):
+    try:
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as stream:
+            return json.loads(stream.readline())
+    except (OSError, ValueError) as e:
+        raise AgentError(f"ERROR: The agent didn't answer: {e}")
+    finally:
+        client.close()
+
+def agentRequest(op : str, **args):
+    """
+    Sends a request to the agent of the active profile. Returns None when there's no agent to answer it,
+    so the caller does the work itself.
+    """
+    client = _connect()
+    if client is None:
+        return None
+    
+    from keybin.core import getConfig
+    response = _exchange(client, {"op" : op, "profile" : getConfig().active_profile, "args" : args})
+    if response.get("ok"):
+        return response
+    if response.get("error") == "unavailable": ## es el agent de otro perfil, ya se esta cerrando
+        return None
+    raise getattr(exceptions, response.get("error", ""), KeybinError)(response.get("message"))
+
+def startAgent():
+    """
+    Starts the agent for the active session in the background. Returns False if the platform can't run it.
+    """
+    if not AGENT_ENABLED or not hasattr(socket, "AF_UNIX"):
+        return False
+    if agentRequest("ping") is not None:
+        return True
+    subprocess.Popen(
+        [sys.executable, "-c", "from keybin.agent import runAgent; runAgent()"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True, close_fds=True,
+    )
+    return True
+
+def stopAgent():
+    """
+    Asks the running agent, if any, to drop the vault and exit.
+    """
+    client = _connect()
+    if client is None:
+        return False
+    try:
+        _exchange(client, {"op" : "stop"})
+    except AgentError:
+        pass
+    return True
+
+
+class Agent:
+    """
+    Keeps the active profile's vault loaded and answers find/add/delete from keybin commands.
+    """
+    
+    def __init__(self, profile : str):
+        self.profile = profile
+        self.logFile = None
+        self.stamp = None
+        self.stopped = False
+        self.lastActivity = time.time()
+    
+    def _vaultStamp(self):
+        from keybin.core import getActivePath, getJournalPath
+        stamp = []
+        for path in (getActivePath(), getJournalPath(getActivePath())):
+            stat = path.stat() if path.exists() else None
+            stamp.append((stat.st_mtime_ns, stat.st_size) if stat else None)
+        return tuple(stamp)
+    
+    def vault(self):
+        """
+        Returns the loaded vault, reloading it if another process changed the file.
+        """
+        from keybin.core import getLogFile
+        from keybin.indexes import getFuzzyIndex, getIndexes
+        if self.logFile is None or self._vaultStamp() != self.stamp:
+            self.logFile = getLogFile()
+            self.stamp = self._vaultStamp()
+        getIndexes(self.logFile) ## el agent hace muchas busquedas, aca si conviene armar los indices
+        getFuzzyIndex(self.logFile) ## (si un merge los descarto se rearman aca)
+        return self.logFile
+    
+    def _sessionAlive(self):
+        """
+        Whether the session in the store is still valid. The agent checks it itself, so it doesn't
+        outlive the session no matter who talks to it.
+        """
+        from keybin.core import _getSessionData, SESSION_TIME
+        try:
+            timestamp = int(_getSessionData(self.profile, fresh=True).split(":")[1])
+        except (AttributeError, IndexError, ValueError): ## no hay sesion, o esta rota
+            return False
+        return time.time() - timestamp <= SESSION_TIME
+    
+    def handle(self, request : dict):
+        from cryptography.fernet import Fernet
+        from keybin.core import getConfig, getSessionDek, searchLogFile, insertLog, removeLog, _sealPassword
+        op = request.get("op")
+        args = request.get("args", {})
+        
+        if op == "stop":
+            self.stopped = True
+            return {"ok" : True}
+        if request.get("profile") != self.profile or getConfig().active_profile != self.profile:
+            self.stopped = True ## la sesion cambio, este agent ya no sirve
+            return {"ok" : False, "error" : "unavailable"}
+        if not self._sessionAlive():
+            self.stopped = True ## vencio, el dek y el vault se van con el agent
+            return {"ok" : False, "error" : "unavailable"}
+        if op in ("find", "add", "delete"): ## ping (agent status) no cuenta como uso
+            self.lastActivity = time.time()
+        
+        try:
+            if op == "ping":
+                return {"ok" : True, "profile" : self.profile, "pid" : os.getpid(), "logs" : len(self.vault().logs)}
+            if op == "find":
+                logs = searchLogFile(self.vault(), **args)
+                ## los passwords viajan sellados, el que pregunta desencripta solo los que muestra
+                return {"ok" : True, "logs" : [dict(log.asDict(), _sealedPassword=log._sealedPassword) for log in logs]}
+            if op == "add":
+                log = insertLog(self.vault(), **args)
+                self.stamp = self._vaultStamp()
+                if getConfig().profiles[self.profile].encrypted: ## en memoria queda sellado como los demas
+                    log._sealedPassword, log.password = _sealPassword(log, Fernet(getSessionDek())), None
+                return {"ok" : True, "logID" : log.logID}
+            if op == "delete":
+                removeLog(self.vault(), args["id"])
+                self.stamp = self._vaultStamp()
+                return {"ok" : True}
+            return {"ok" : False, "error" : "KeybinError", "message" : f"ERROR: Unknown agent request '{op}'"}
+        except KeybinError as e:
+            return {"ok" : False, "error" : type(e).__name__, "message" : str(e)}
+        except Exception as e:
+            return {"ok" : False, "error" : "KeybinError", "message" : f"ERROR: {e}"}
+    
+    def serve(self, path : Path):
+        from keybin.core import SESSION_TIME
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            oldUmask = os.umask(0o177) ## el socket nace con 0600, solo el usuario puede hablarle
+            try:
+                server.bind(str(path))
+            finally:
+                os.umask(oldUmask)
+            inode = path.stat().st_ino
+            server.listen()
+            try:
+                while not self.stopped:
+                    remaining = SESSION_TIME - (time.time() - self.lastActivity)
+                    if remaining <= 0: ## sesion vencida por inactividad
+                        break
+                    server.settimeout(remaining)
+                    try:
+                        connection, _ = server.accept()
+                    except socket.timeout:
+                        continue
+                    with connection:
+                        if not _isSameUser(connection):
+                            continue
+                        connection.settimeout(AGENT_TIMEOUT)
+                        try:
+                            with connection.makefile("rb") as stream:
+                                request = json.loads(stream.readline())
+                            connection.sendall(json.dumps(self.handle(request)).encode("utf-8") + b"\n")
+                        except (OSError, ValueError):
+                            continue
+            finally:
+                if path.exists() and path.stat().st_ino == inode: ## si otro agent ya lo reemplazo, no lo borramos
+                    path.unlink()
+
+def _isSameUser(connection : socket.socket):
+    if not hasattr(socket, "SO_PEERCRED"): ## sin SO_PEERCRED dependemos de los permisos del socket
+        return True
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    pid, uid, gid = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+def runAgent():
+    """
+    Entry point of the agent process started by startAgent.
+    """
+    global _isAgent
+    from keybin.core import getConfig, getSessionDek, tokenCheck
+    
+    config = getConfig()
+    profile = config.active_profile
+    if not profile:
+        return
+    stopAgent() ## si quedo uno de otra sesion lo cerramos
+    _isAgent = True
+    tokenCheck() ## falla si no hay sesion valida
+    if config.profiles[profile].encrypted:
+        getSessionDek()
+    
+    path = getSocketPath()
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.chmod(path.parent, 0o700) ## mkdir no toca el modo si ya existia (FileStore la pudo crear con parents)
+    path.unlink(missing_ok=True)
+    agent = Agent(profile)
+    agent.vault()
+    agent.serve(path)
@@ -0,0 +1,87 @@
+"""
+asyncio version of Vault, for services that fetch secrets from an event loop.
+
+Unlocking (the KDF), decrypting and reading or writing the vault block, so they run in an executor
+while the loop keeps serving other requests. hashlib and cryptography release the GIL during the heavy
+parts, so a thread pool is enough. Calls made while the vault is still unlocking all wait for that
+one unlock instead of starting their own.
+"""
+import asyncio
+from functools import partial
+from keybin.vault import Vault
+
+
+def _openVault(profile : str | None, key : str | None):
+    return Vault(profile, key).open()
+
+
+class AsyncVault:
+    """
+    Same operations as Vault, awaitable:
+
+        async with AsyncVault("work", "masterkey") as vault:
+            logs = await vault.find("github", limit=1)
+
+    Operations run one at a time, in executor (the loop's default executor if not given). Share one
+    AsyncVault between the tasks that use a profile, so they share the unlock and the loaded vault.
+    """
+
+    def __init__(self, profile : str | None = None, key : str | None = None, executor = None):
+        self.profile = profile
+        self._key = key
+        self._executor = executor
+        self._vault : Vault | None = None
+        self._opening : asyncio.Future | None = None ## unlock en curso, lo esperan todas las llamadas que llegan mientras tanto
+        self._lock = asyncio.Lock()
+
+    async def _run(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(function, *args, **kwargs))
+
+    async def open(self):
+        if self._vault is None:
+            if self._opening is None:
+                self._opening = asyncio.ensure_future(self._run(_openVault, self.profile, self._key))
+            opening = self._opening
+            try:
+                vault = await asyncio.shield(opening) ## si cancelan a uno que espera, el unlock sigue para los demas
+            except Exception:
+                if self._opening is opening : self._opening = None ## el proximo open vuelve a intentar
+                raise
+            self._vault = vault
+            self.profile = vault.profile
+        return self
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            await self.flush()
+        else:
+            await self.discard()
+        return False
+
+    async def _call(self, method : str, *args, **kwargs):
+        await self.open()
+        async with self._lock:
+            return await self._run(getattr(self._vault, method), *args, **kwargs)
+
+    async def find(self, search : str | None = None, service : str | None = None, user : str | None = None, email : str | None = None, tags : list[str] | None = None, id : int | None = None, limit : int | None = None):
+        return await self._call("find", search, service, user, email, tags, id, limit)
+
+    async def get(self, id : int):
+        return await self._call("get", id)
+
+    async def add(self, service : str | None = None, user : str | None = None, email : str | None = None, password : str | None = None, tags : list[str] | None = None):
+        return await self._call("add", service, user, email, password, tags)
+
+    async def delete(self, id : int):
+        return await self._call("delete", id)
+
+    async def flush(self):
+        if self._vault is not None:
+            await self._call("flush")
+
+    async def discard(self):
+        if self._vault is not None:
+            await self._call("discard")
@@ -0,0 +1,184 @@
+"""
+Password reuse and weakness audit.
+
+Passwords are decrypted one at a time and only hashes of them are kept: a keyed digest of the whole
+password and hashes of its trigrams, with a key that is random for every audit and never saved.
+
+- Reuse: logs with the same digest, grouped in one pass.
+- Near duplicates ("Summer2023!" and "Summer2024!"): the Dice coefficient of the trigram sets. To avoid
+  comparing every pair, each password is only compared with the ones that share one of its rarest
+  trigrams (prefix filtering). Two sets that are similar enough always share one of those.
+- Weak: short passwords, passwords with a small character pool and passwords made of a few repeated characters.
+"""
+import hashlib, math, os, string
+from collections import Counter
+from itertools import chain
+from typing import Iterable
+from cryptography.fernet import Fernet
+from keybin.models import LogRecord
+from keybin.vaultfile import decryptBytes
+
+MIN_LENGTH = 12
+MIN_ENTROPY = 60 ## bits, largo * log2(caracteres posibles)
+SIMILARITY_THRESHOLD = 0.7 ## dice de los trigramas
+_POOLS = tuple(frozenset(chars) for chars in (string.ascii_lowercase, string.ascii_uppercase, string.digits, string.punctuation))
+_ASCII = frozenset().union(*_POOLS)
+
+
+def estimateEntropy(password : str):
+    """
+    Bits of a password if its characters were random, from the character classes it uses.
+    """
+    used = set(password)
+    pool = sum(len(chars) for chars in _POOLS if not chars.isdisjoint(used))
+    pool += len(used - _ASCII) ## unicode y espacios
+    return len(password) * math.log2(pool) if pool > 1 else 0.0
+
+def weaknessReasons(password : str):
+    reasons = []
+    if len(password) < MIN_LENGTH:
+        reasons.append("short")
+    if estimateEntropy(password) < MIN_ENTROPY:
+        reasons.append("low entropy")
+    if len(password) >= 4 and len(set(password)) * 3 <= len(password):
+        reasons.append("repeated characters")
+    return reasons
+
+
+class _Hasher:
+    def __init__(self):
+        self.key = os.urandom(32) ## solo vive durante el audit
+
+    def digest(self, password : str):
+        return hashlib.blake2b(password.encode("utf-8"), key=self.key, digest_size=16).digest()
+
+    def grams(self, password : str):
+        ## hash() con la key adelante, un blake2b por trigrama era la mitad del audit
+        data, key = password.encode("utf-8"), self.key
+        return frozenset(hash(key + data[start:start + 3]) for start in range(len(data) - 2))
+
+
+def _similarPairs(gramSets : list[frozenset], threshold : float):
+    """
+    Pairs of positions in gramSets whose Dice coefficient is at least threshold.
+    """
+    jaccard = threshold / (2 - threshold) ## dice >= t implica jaccard >= t / (2 - t)
+    frequency = Counter(chain.from_iterable(gramSets))
+    ## orden global por frecuencia, los raros primero (tienen listas cortas). Los que aparecen una sola vez
+    ## van antes que todos, pero no hace falta ordenarlos: no los comparte nadie, nunca dan candidatos
+    rank = {gram : position for position, gram in enumerate(sorted((gram for gram, seen in frequency.items() if seen > 1), key=frequency.__getitem__))}
+    shared = rank.keys()
+
+    index : dict[int, list[int]] = {}
+    pairs = []
+    ## de menor a mayor, asi cada uno solo busca entre los que ya estan en el indice (mas chicos o iguales)
+    for position in sorted(range(len(gramSets)), key=lambda position: len(gramSets[position])):
+        grams = gramSets[position]
+        ranked = sorted(map(rank.__getitem__, grams & shared))
+        prefixLength = len(grams) - math.ceil(jaccard * len(grams)) + 1 - (len(grams) - len(ranked))
+        if prefixLength <= 0: ## el prefijo son todos trigramas unicos
+            continue
+        prefix = ranked[:prefixLength]
+        minSize = jaccard * len(grams)
+        candidates = set()
+        for gram in prefix:
+            candidates.update(index.get(gram, ()))
+        for other in candidates:
+            otherGrams = gramSets[other]
+            if len(otherGrams) < minSize:
+                continue
+            if 2 * len(grams & otherGrams) >= threshold * (len(grams) + len(otherGrams)):
+                pairs.append((other, position))
+        for gram in prefix:
+            index.setdefault(gram, []).append(position)
+    return pairs
+
+def _groups(pairs : list[tuple[int, int]]):
+    parent : dict[int, int] = {}
+    def find(item):
+        while parent.setdefault(item, item) != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+    for first, second in pairs:
+        parent[find(first)] = find(second)
+    groups : dict[int, list[int]] = {}
+    for item in parent:
+        groups.setdefault(find(item), []).append(item)
+    return list(groups.values())
+
+def auditPasswords(entries : Iterable[tuple[str | None, LogRecord, Fernet | None]], similarity : float = SIMILARITY_THRESHOLD):
+    """
+    Audits (profile, log, f) entries, f being the DEK of the log's profile (None if it isn't encrypted).
+    Returns {"checked", "reused", "similar", "weak"}. Logs show up as {"profile", "logID", "service"};
+    reused and similar are groups of them, weak entries also have their "reasons".
+    """
+    hasher = _Hasher()
+    owners : dict[bytes, list[dict]] = {} ## digest -> logs con ese password
+    analysis : dict[bytes, tuple[frozenset, list[str]]] = {} ## digest -> (trigramas, debilidades), uno por password distinto
+    weak = []
+    checked = 0
+    for profile, log, f in entries:
+        if log._sealedPassword is not None: ## se desencripta solo para hashearlo, el log sigue sellado
+            password = decryptBytes(f, log._sealedPassword.encode("utf-8")).decode("utf-8")
+        else:
+            password = log.password
+        if not password:
+            continue
+        checked += 1
+        entry = {"profile" : profile, "logID" : log.logID, "service" : log.service}
+        digest = hasher.digest(password)
+        if digest not in analysis:
+            analysis[digest] = (hasher.grams(password), weaknessReasons(password))
+            owners[digest] = []
+        owners[digest].append(entry)
+        reasons = analysis[digest][1]
+        if reasons:
+            weak.append(dict(entry, reasons=reasons))
+
+    digests = list(analysis)
+    reused = [logs for logs in owners.values() if len(logs) > 1]
+    similar = []
+    for group in _groups(_similarPairs([analysis[digest][0] for digest in digests], similarity)):
+        similar.append([entry for position in sorted(group) for entry in owners[digests[position]]])
+    return {"checked" : checked, "reused" : reused, "similar" : similar, "weak" : weak}
+
+def auditProfiles(allProfiles : bool = False, keys : dict[str, str] | None = None):
+    """
+    Audits the active profile, or every profile with allProfiles (then encrypted profiles other than
+    the active one need their masterkey in keys). Reuse across profiles is reported too.
+    Returns (report, skipped) like searchAllProfiles.
+    """
+    from pathlib import Path
+    from keybin.core import getConfig, getSessionDek, unwrapDek, readLogFile
+    from keybin.exceptions import KeybinError
+
+    config = getConfig()
+    keys = keys or {}
+    names = list(config.profiles) if allProfiles else [config.active_profile]
+    skipped : dict[str, str] = {}
+
+    def entries(): ## los vaults se abren de a uno, a medida que el audit los recorre
+        for name in names:
+            userProfile = config.profiles[name]
+            path = Path(userProfile.data_path)
+            try:
+                f = None
+                if userProfile.encrypted:
+                    if keys.get(name):
+                        f = Fernet(unwrapDek(keys[name], userProfile))
+                    elif name == config.active_profile:
+                        f = Fernet(getSessionDek())
+                    else:
+                        skipped[name] = "masterkey needed"
+                        continue
+                if not path.exists():
+                    continue
+                logFile = readLogFile(path, userProfile, f)
+            except KeybinError as e:
+                skipped[name] = str(e)
+                continue
+            for log in logFile.logs.values():
+                yield name, log, f
+
+    return auditPasswords(entries()), skipped
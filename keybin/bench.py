@@ -0,0 +1,220 @@
+"""
+Benchmarks for keybin's main operations over synthetic vaults.
+
+Everything runs against a throwaway config, data directory and in-memory session store, so the user's
+profiles and session are never touched. Used by `keybin bench` and benchmarks/run.py.
+"""
+import json, platform, random, string, tempfile, time, tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from keybin import core, agent
+from keybin.sessions import MemoryStore
+from keybin.indexes import FuzzyIndex
+from keybin.columns import getColumns
+from keybin.models import LogRecord, LogsFileModel
+
+BENCH_MASTERKEY = "keybin-bench-masterkey"
+DEFAULT_SIZES = (1000, 10000, 100000)
+SERVICES = ("GitHub", "GitLab", "Google", "AWS", "Azure", "Slack", "Jira", "Netflix", "Spotify", "Dropbox")
+TAGS = ("dev", "work", "personal", "infra", "prod", "staging", "finance", "social")
+FUZZY_QUERIES = ("github", "gogle", "infra")
+
+
+def _resetCaches():
+    core._configCache = None
+    core._sessionDek = None
+    core._unlockedDeks.clear()
+    core._sessionCache.clear()
+    core._pendingSessions.clear() ## no se escriben al salir, el store es de mentira
+
+@contextmanager
+def isolatedKeybin():
+    """
+    Points keybin to a temporary config, data path and session store, restoring everything on exit.
+    """
+    saved = (core.CONFIG_PATH, core.DEFAULT_STORAGE_PATH, core._sessionStore, agent.AGENT_ENABLED)
+    with tempfile.TemporaryDirectory(prefix="keybin-bench-") as tmp:
+        _resetCaches()
+        core.CONFIG_PATH = Path(tmp, "config.json")
+        core.DEFAULT_STORAGE_PATH = str(Path(tmp, "data"))
+        core.setSessionStore(MemoryStore())
+        agent.AGENT_ENABLED = False
+        try:
+            yield Path(tmp)
+        finally:
+            _resetCaches()
+            core.CONFIG_PATH, core.DEFAULT_STORAGE_PATH, oldStore, agent.AGENT_ENABLED = saved
+            core.setSessionStore(oldStore)
+
+def syntheticLogs(size : int, seed : int = 0):
+    rng = random.Random(seed)
+    createdAt = datetime.now(timezone.utc).isoformat()
+    logs = {}
+    for logID in range(1, size + 1):
+        user = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+        logs[logID] = LogRecord(
+            logID=logID,
+            service=f"{rng.choice(SERVICES)}{'' if rng.random() < 0.3 else rng.randint(1, size)}",
+            user=user,
+            email=f"{user}@{rng.choice(('gmail.com', 'corp.io', 'mail.org'))}",
+            password="".join(rng.choices(string.ascii_letters + string.digits, k=16)),
+            tags=rng.sample(TAGS, rng.randint(0, 3)) or None,
+            createdAt=createdAt,
+            uid=f"{rng.getrandbits(128):032x}",
+            updatedAt=createdAt,
+        )
+    return logs
+
+def fillProfile(name : str, size : int, encrypted : bool, storage : str = "file"):
+    """
+    Creates a profile with `size` synthetic logs and logs into it.
+    """
+    key = BENCH_MASTERKEY if encrypted else None
+    core.startProfile(name, key, storage=storage)
+    if core.getConfig().active_profile:
+        core.eraseToken()
+    core.createToken(name, key)
+    logs = syntheticLogs(size)
+    logFile = LogsFileModel(currentLogId=size, logs=logs)
+    core.getActivePath().parent.mkdir(parents=True, exist_ok=True)
+    core.saveLogFile(logFile)
+    return key
+
+def percentile(samples : list[float], fraction : float):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def _timeIt(function, repeat : int, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup : setup()
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def _peakKb(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+def _result(size, encrypted, storage, operation, samples, peakKb = None):
+    return {
+        "size" : size,
+        "encrypted" : encrypted,
+        "storage" : storage,
+        "operation" : operation,
+        "runs" : len(samples),
+        "p50_ms" : percentile(samples, 0.5) * 1000,
+        "p90_ms" : percentile(samples, 0.9) * 1000,
+        "p99_ms" : percentile(samples, 0.99) * 1000,
+        "mean_ms" : sum(samples) / len(samples) * 1000,
+        "peak_kb" : peakKb,
+    }
+
+def benchProfile(size : int, encrypted : bool, storage : str = "file", repeat : int = 5):
+    """
+    Times every operation over one synthetic vault, returns one result per operation.
+    """
+    name = f"bench-{size}-{'enc' if encrypted else 'plain'}-{storage}"
+    key = fillProfile(name, size, encrypted, storage)
+    results = []
+    def add(operation, samples, peakKb = None):
+        results.append(_result(size, encrypted, storage, operation, samples, peakKb))
+
+    add("createToken", _timeIt(lambda: core.createToken(name, key), repeat, setup=core.eraseToken))
+    add("getLogFile", _timeIt(core.getLogFile, repeat), _peakKb(core.getLogFile))
+
+    firstNew = core.getLogFile().currentLogId + 1
+    add("newLog", _timeIt(lambda: core.newLog("BenchService", "bench", "bench@corp.io", "benchpass", ["bench"]), repeat))
+    newIDs = iter(range(firstNew, firstNew + repeat))
+    add("deleteLog", _timeIt(lambda: core.deleteLog(next(newIDs), True), repeat))
+
+    add("doSearch --id", _timeIt(lambda: core.doSearch(id=size // 2), repeat))
+    add("doSearch --service", _timeIt(lambda: core.doSearch(service="GitHub"), repeat))
+    add("doSearch --tags", _timeIt(lambda: core.doSearch(tags=["dev", "work"]), repeat))
+
+    logFile = core.getLogFile()
+    logs = list(logFile.logs.values())
+    for query in FUZZY_QUERIES:
+        add(f"doSearch '{query}'", _timeIt(lambda: core.doSearch(query), repeat), _peakKb(lambda: core.doSearch(query)))
+        add(f"_fuzzySearch '{query}'", _timeIt(lambda: core._fuzzySearch(query, logs), repeat))
+        add(f"LogColumns.fuzzyScores '{query}'", _timeIt(lambda: getColumns(logFile).fuzzyScores(query), repeat))
+
+    index = None
+    def build():
+        nonlocal index
+        index = FuzzyIndex(logFile.logs)
+    add("FuzzyIndex build", _timeIt(build, max(1, repeat // 2)), _peakKb(lambda: FuzzyIndex(logFile.logs)))
+    for query in FUZZY_QUERIES:
+        add(f"FuzzyIndex.search '{query}'", _timeIt(lambda: index.search(query), repeat))
+
+    core.eraseToken()
+    return results
+
+def runBenchmarks(sizes = DEFAULT_SIZES, encrypted = (False, True), storages = ("file",), repeat : int = 5, progress = None):
+    results = []
+    with isolatedKeybin():
+        for size in sizes:
+            for isEncrypted in encrypted:
+                for storage in storages:
+                    if progress : progress(size, isEncrypted, storage)
+                    results.extend(benchProfile(size, isEncrypted, storage, repeat))
+    return {
+        "meta" : {
+            "date" : datetime.now(timezone.utc).isoformat(),
+            "python" : platform.python_version(),
+            "platform" : platform.platform(),
+            "repeat" : repeat,
+        },
+        "results" : results,
+    }
+
+def _resultKey(result : dict):
+    return (result["size"], result["encrypted"], result["storage"], result["operation"])
+
+def compareResults(current : dict, baseline : dict):
+    """
+    Pairs every current result with the baseline one, adding the p50 ratio (current / baseline).
+    """
+    previous = {_resultKey(result) : result for result in baseline["results"]}
+    compared = []
+    for result in current["results"]:
+        old = previous.get(_resultKey(result))
+        ratio = result["p50_ms"] / old["p50_ms"] if old and old["p50_ms"] else None
+        compared.append({**result, "baseline_p50_ms" : old["p50_ms"] if old else None, "ratio" : ratio})
+    return compared
+
+def loadResults(path : str):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+def saveResults(results : dict, path : str):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=4)
+
+def printResults(results : dict, baseline : dict | None = None):
+    from rich.console import Console
+    from rich.table import Table
+
+    rows = compareResults(results, baseline) if baseline else results["results"]
+    table = Table(title="keybin benchmarks")
+    for column in ("size", "enc", "storage", "operation", "p50 ms", "p90 ms", "p99 ms", "mean ms", "peak KB"):
+        table.add_column(column, justify="left" if column in ("storage", "operation") else "right", no_wrap=column == "operation")
+    if baseline : table.add_column("vs baseline", justify="right")
+    for row in rows:
+        cells = [
+            str(row["size"]), "yes" if row["encrypted"] else "no", row["storage"], row["operation"],
+            f"{row['p50_ms']:.2f}", f"{row['p90_ms']:.2f}", f"{row['p99_ms']:.2f}", f"{row['mean_ms']:.2f}",
+            "" if row["peak_kb"] is None else str(row["peak_kb"]),
+        ]
+        if baseline:
+            ratio = row["ratio"]
+            if ratio is None : cells.append("-")
+            else : cells.append(f"[{'red' if ratio > 1.1 else 'green' if ratio < 0.9 else 'white'}]{ratio:.2f}x[/]") ## >10% mas lento en rojo
+        table.add_row(*cells)
+    Console().print(table)
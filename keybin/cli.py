@@ -1,23 +1,65 @@
-import typer, pyperclip, time
+import typer, time
 from keybin.commands.profile import profile_app
 from keybin.commands.log import log_app
-from keybin.core import newSecureString, getConfig, getLogFile, createToken, eraseToken, tokenCheck
+from keybin.commands.vault import vault_app
+from keybin.commands.agent import agent_app
 from .exceptions import *
 
+## los modulos pesados (core, rich, pyperclip) se importan adentro de cada comando,
+## asi comandos simples como genpass arrancan rapido. Ver benchmarks/startup.py
+
 app = typer.Typer()
 app.add_typer(profile_app, name="profile")
 app.add_typer(log_app, name ="log")
+app.add_typer(vault_app, name="vault")
+app.add_typer(agent_app, name="agent")
+
+@app.callback()
+def main(
+    ctx : typer.Context,
+    timings : bool = typer.Option(False, "--timings", help="Print how long each phase of the command took (keyring, KDF, decrypt, search...).")
+    ):
+    if timings:
+        from keybin import timings as recorder
+        recorder.enable()
+        ctx.call_on_close(lambda: typer.echo(recorder.formatReport(), err=True)) ## corre aunque el comando haga exit()
 
 @app.command("gp")
 @app.command("genpass")
 def genpass(
     copy : bool = typer.Option(False,"--copy", "-c", help="If true, copies the new password to the clipboard"),
     symbols: bool = typer.Option(True, help="If true, include symbols in the generated password."),
-    length : int = typer.Option(16, "--length", "-l", help="Desired length for new password")
+    length : int = typer.Option(16, "--length", "-l", help="Desired length for new password"),
+    count : int = typer.Option(1, "--count", "-n", min=1, help="How many passwords to generate, one per line."),
+    format : str = typer.Option("text", "--format", "-f", help="text or jsonl."),
+    require : list[str] = typer.Option([], "--require", "-r", help="Character class every password must have: lower, upper, digit or symbol. Repeat it for several."),
+    no_ambiguous : bool = typer.Option(False, "--no-ambiguous", help="Leave out characters that are easy to confuse, like l, 1, O and 0."),
+    min_entropy : float = typer.Option(None, "--min-entropy", help="Fail unless each password has at least this many bits of entropy.")
     ):    
-                
-    newpass = newSecureString(symbols, length)
-    if copy: pyperclip.copy(newpass)
+    from keybin.passgen import newSecureStrings, passwordEntropy
+    
+    if format not in ("text", "jsonl"):
+        return typer.secho("ERROR: Format must be 'text' or 'jsonl'.", fg="red")
+    if copy and count > 1:
+        return typer.secho("ERROR: --copy only works with a single password.", fg="red")
+    try:
+        passwords = newSecureStrings(count, length, symbols, no_ambiguous, tuple(require), min_entropy)
+    except ValueError as e:
+        return typer.secho(f"ERROR: {e}", fg="red")
+    
+    if format == "jsonl":
+        import json
+        entropy = round(passwordEntropy(length, symbols, no_ambiguous), 1)
+        typer.echo("".join(json.dumps({"password" : password, "entropy" : entropy}) + "\n" for password in passwords), nl=False)
+        return passwords
+    if count > 1: ## sin adornos, para poder pasarlo a otro comando
+        typer.echo("\n".join(passwords))
+        return passwords
+    
+    newpass = passwords[0]
+    if copy: 
+        import pyperclip
+        pyperclip.copy(newpass)
     newpass = typer.style(newpass, fg="yellow", bold=True)    
     typer.echo(f"Your new secure password : {newpass}")
     
@@ -25,6 +67,7 @@ def genpass(
 
 @app.command("status")
 def userStatus() :
+    from keybin.core import getConfig, getLogFile, tokenCheck
     typer.secho("--- Keybin status ---", fg="cyan")
     
     config = getConfig()
@@ -63,21 +106,54 @@ def userStatus() :
         return typer.echo(f"Session remaining time: {typer.style("Expired, log in again.", fg="red")}")
 
 
+@app.command("bench")
+def bench(
+    sizes : str = typer.Option("1000,10000,100000", "--sizes", "-s", help="Comma separated vault sizes to benchmark"),
+    repeat : int = typer.Option(5, "--repeat", "-r", help="Runs per operation"),
+    storage : str = typer.Option("file", "--storage", help="Storage backends to benchmark, comma separated (file, journal)"),
+    output : str = typer.Option(None, "--json", help="Write the results as JSON to this path"),
+    compare : str = typer.Option(None, "--compare", help="JSON results of a previous run to compare against"),
+    ):
+    from keybin.bench import runBenchmarks, printResults, saveResults, loadResults
+    
+    try:
+        sizeList = [int(size) for size in sizes.split(",")]
+    except ValueError:
+        return typer.secho("ERROR: Sizes must be comma separated numbers", fg="red")
+    baseline = loadResults(compare) if compare else None
+    
+    def progress(size, encrypted, storage):
+        typer.secho(f"Benchmarking {size} logs ({'encrypted' if encrypted else 'not encrypted'}, {storage})...", fg="cyan", err=True)
+    
+    results = runBenchmarks(sizeList, storages=tuple(storage.split(",")), repeat=repeat, progress=progress)
+    printResults(results, baseline)
+    if output:
+        saveResults(results, output)
+        typer.secho(f"Results saved to {output}", fg="green")
+
+
 @app.command("login")
 def login(
     user : str = typer.Argument(None, help="User to log onto"),
-    key : str = typer.Argument(None, help="Masterkey for profile") ):
+    key : str = typer.Argument(None, help="Masterkey for profile"),
+    agent : bool = typer.Option(True, help="Keep the vault unlocked in a background agent while the session lasts."),
+    session_store : str = typer.Option(None, "--session-store", help="Where the session is kept: 'keyring' (default) or 'file', a private file in the runtime directory for hosts without a keyring.") ):
+    from keybin.core import createToken
+    from keybin.agent import startAgent
     
     if not user : 
         typer.secho("ERROR: Please select a profile to log into", fg="red")
         exit()
+    if session_store not in (None, "keyring", "file"):
+        return typer.secho("ERROR: Session store must be 'keyring' or 'file'.", fg="red")
     
     try:
-        createToken(user, key)
+        createToken(user, key, session_store)
         typer.secho(f"Logged succesfully into {user}", fg = "green")
+        if agent : startAgent()
     except PasswordNeededError: 
         typer.secho(f"Enter masterkey for profile '{typer.style(f"{user}", fg="yellow", bold = True)}': ", bold = True)
-        login(user, key = typer.prompt("",hide_input=True))
+        login(user, key = typer.prompt("",hide_input=True), agent = agent, session_store = session_store)
     except InvalidPasswordError:
         return typer.secho("ERROR: Invalid key", fg = "red")
     except UserNotFoundError:
@@ -89,6 +165,7 @@ def login(
     
 @app.command("logout")
 def logout():
+    from keybin.core import eraseToken
     if not eraseToken():
         return typer.secho("Already logged out", fg="yellow")    
     typer.secho("Logged out successfully", fg = "green")
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Columnar copy of a vault's logs, for scans over the whole vault.
+
+One list per field, aligned by position in the vault's order, plus lowercased copies of the fields
+fuzzy search looks at. Filters compare a single list instead of touching every log object, and the
+fuzzy scoring of each column runs in one rapidfuzz batch call.
+"""
+from rapidfuzz import fuzz, process
+from keybin.models import LogRecord, LogsFileModel
+from keybin.indexes import FUZZY_SCORE_THRESHOLD
+
+SEARCH_FIELDS = ("service", "user", "email")
+
+
+def _lowered(values):
+    return [value.lower() if value else None for value in values]
+
+
+class LogColumns:
+    """
+    Deleted logs leave a hole (None in every column) so positions stay valid, the holes are dropped
+    once they are half of the columns.
+    """
+
+    def __init__(self, ids : list[int], service : list, user : list, email : list, tags : list, createdAt : list):
+        self.ids = ids
+        self.service = service
+        self.user = user
+        self.email = email
+        self.tags = tags
+        self.createdAt = createdAt
+        self._lowered : dict[str, list] | None = None ## copias en minuscula, se arman en la primera busqueda fuzzy
+        self._positions = {logID : position for position, logID in enumerate(ids)}
+        self._holes = 0
+        self._flatTags : tuple[list[str], list[int]] | None = None ## (tags, posicion de su log), se arma al buscar
+
+    @classmethod
+    def fromLogs(cls, logs : dict[int, LogRecord]):
+        records = logs.values()
+        return cls(*([getattr(log, field) for log in records] for field in ("logID", "service", "user", "email", "tags", "createdAt")))
+
+    def add(self, log : LogRecord):
+        position = self._positions.get(log.logID)
+        if position is None: ## los ids nuevos van al final, igual que en el dict de logs
+            position = len(self.ids)
+            self._positions[log.logID] = position
+            for column in (self.ids, self.service, self.user, self.email, self.tags, self.createdAt, *(self._lowered or {}).values()):
+                column.append(None)
+        self._set(position, log.logID, log.service, log.user, log.email, log.tags, log.createdAt)
+
+    def remove(self, logID : int):
+        position = self._positions.pop(logID, None)
+        if position is None:
+            return
+        self._set(position, None, None, None, None, None, None)
+        self._holes += 1
+
+    def _set(self, position, logID, service, user, email, tags, createdAt):
+        self.ids[position] = logID
+        self.service[position] = service
+        self.user[position] = user
+        self.email[position] = email
+        self.tags[position] = tags
+        self.createdAt[position] = createdAt
+        if self._lowered is not None:
+            for field, value in zip(SEARCH_FIELDS, (service, user, email)):
+                self._lowered[field][position] = value.lower() if value else None
+        self._flatTags = None
+
+    def compact(self, logs : dict[int, LogRecord]):
+        """
+        Rebuilds the columns without holes when they got too many. Returns the columns to keep using.
+        """
+        if self._holes * 2 <= len(self.ids):
+            return self
+        return LogColumns.fromLogs(logs)
+
+    def filterIds(self, service : str | None = None, user : str | None = None, email : str | None = None, tags : list[str] | None = None):
+        """
+        IDs matching every exact filter given, or None if no filter was given.
+        """
+        positions = None
+        for column, value in ((self.service, service), (self.user, user), (self.email, email)):
+            if not value:
+                continue
+            if positions is None:
+                positions = [position for position, current in enumerate(column) if current == value]
+            else:
+                positions = [position for position in positions if column[position] == value]
+        for tag in tags or []:
+            candidates = range(len(self.ids)) if positions is None else positions
+            positions = [position for position in candidates if self.tags[position] and tag in self.tags[position]]
+        if positions is None:
+            return None
+        ids = self.ids
+        return {ids[position] for position in positions}
+
+    def lowered(self):
+        if self._lowered is None:
+            self._lowered = {field : _lowered(getattr(self, field)) for field in SEARCH_FIELDS}
+        return self._lowered
+
+    def _tagColumn(self):
+        if self._flatTags is None:
+            values, owners = [], []
+            for position, tags in enumerate(self.tags):
+                for tag in tags or ():
+                    values.append(tag)
+                    owners.append(position)
+            self._flatTags = (values, owners)
+        return self._flatTags
+
+    def fuzzyScores(self, search : str):
+        """
+        Returns {position : score} of the logs whose best field passes the fuzzy threshold.
+        Same scores as a per-log partial_ratio scan, rounded the way thefuzz does.
+        """
+        search = search.lower()
+        cutoff = FUZZY_SCORE_THRESHOLD - 0.5 ## se redondea despues, igual que thefuzz
+        scores : dict[int, int] = {}
+        tagValues, tagOwners = self._tagColumn()
+        columns = [(column, None) for column in self.lowered().values()] + [(tagValues, tagOwners)]
+        for column, owners in columns:
+            for _, raw, index in process.extract(search, column, scorer=fuzz.partial_ratio, score_cutoff=cutoff, limit=None):
+                score = int(round(raw))
+                if score < FUZZY_SCORE_THRESHOLD:
+                    continue
+                position = owners[index] if owners else index
+                if score > scores.get(position, 0):
+                    scores[position] = score
+        return scores
+
+
+def getColumns(logFile : LogsFileModel):
+    """
+    The vault's columns, built from its logs if the loader didn't already build them.
+    """
+    if logFile._columns is None:
+        logFile._columns = LogColumns.fromLogs(logFile.logs)
+    return logFile._columns
@@ -0,0 +1,30 @@
+import typer
+from keybin.decorators import require_active_session
+
+agent_app = typer.Typer()
+
+
+@agent_app.command("start")
+@require_active_session
+def start():
+    from keybin.agent import startAgent
+    if not startAgent():
+        return typer.secho("ERROR: The agent needs Unix domain sockets, not available on this platform.", fg="red")
+    typer.secho("Agent running for the active session.", fg="green")
+
+
+@agent_app.command("stop")
+def stop():
+    from keybin.agent import stopAgent
+    if not stopAgent():
+        return typer.secho("No agent running.", fg="yellow")
+    typer.secho("Agent stopped.", fg="green")
+
+
+@agent_app.command("status")
+def status():
+    from keybin.agent import agentRequest
+    response = agentRequest("ping")
+    if response is None:
+        return typer.secho("No agent running for the active profile.", fg="yellow")
+    typer.echo(f"Agent running for {typer.style(response["profile"], fg="yellow", bold=True)} (pid {response["pid"]}), {response["logs"]} logs loaded.")
@@ -1,11 +1,7 @@
 import typer
-from keybin.models import passwordLog
-from rich.console import Console
-from rich.table import Table
-from keybin.core import newLog, doSearch, newSecureString, require_active_session, deleteLog
-from keybin.exceptions import NoLogFoundError
+from keybin.decorators import require_active_session
+from keybin.exceptions import NoLogFoundError, InvalidPasswordError
 
-console = Console()
 log_app = typer.Typer()
 
 @log_app.command("add")
@@ -19,6 +15,8 @@ def genlog(
     no_prompts: bool = typer.Option(False, "--no-prompts", "-n", help="Don't ask for missing data"),
     autopass: bool = typer.Option(False, "--autopass", "-a", help="Create and auto assign a secure password")
     ):
+    from keybin.core import newLog
+    from keybin.passgen import newSecureString
 
     if password is None and autopass : password = newSecureString()
     
@@ -45,45 +43,150 @@ def find(
     username: str = typer.Option(None, "--user", "-u", help="Search exact match for username"),
     email = typer.Option(None, "--email", "-e", help="Search exact match for email"),
     tags: list[str] = typer.Option([], "--tags", "-t", help="Use this for filtering with tags."),
-    id: int =typer.Option(None, "--id", "-i", help="ID for exact match search")
+    id: int =typer.Option(None, "--id", "-i", help="ID for exact match search"),
+    limit: int = typer.Option(None, "--limit", "-l", min=1, help="Only show the best K results"),
+    all_profiles: bool = typer.Option(False, "--all-profiles", "-A", help="Search every profile, asking for the masterkey of the encrypted ones.")
 ):
+    from rich.console import Console
+    from rich.table import Table
+    from keybin.core import doSearch, revealLog
+    from keybin.timings import span
     try:
-        searchResult: list[passwordLog] = doSearch(search, service, username,email, tags, id)
+        if all_profiles:
+            searchResult = _findAllProfiles(search, service, username, email, tags, id, limit)
+        else:
+            searchResult = [(None, log) for log in doSearch(search, service, username,email, tags, id, limit)]
     
         if not searchResult:
             raise NoLogFoundError("No results for this search")
 
-        table = Table(title="Search Results")
-        table.add_column("ID", justify="right", style="cyan", no_wrap=True)
-        table.add_column("Service", style="magenta")
-        table.add_column("User", style="green")
-        table.add_column("Email", style="yellow")
-        table.add_column("Password", style="red")
-        table.add_column("Tags", style="blue")
-        table.add_column("Created At", style="dim")
+        with span("render"):
+            table = Table(title="Search Results")
+            if all_profiles : table.add_column("Profile", style="bright_white")
+            table.add_column("ID", justify="right", style="cyan", no_wrap=True)
+            table.add_column("Service", style="magenta")
+            table.add_column("User", style="green")
+            table.add_column("Email", style="yellow")
+            table.add_column("Password", style="red")
+            table.add_column("Tags", style="blue")
+            table.add_column("Created At", style="dim")
 
-        for log in searchResult:
-        
-            table.add_row(
-                str(log.logID),
-                log.service,
-                log.user,
-                log.email,
-                log.password,
-                str(log.tags),
-                log.createdAt,
-            )
+            for profile, log in searchResult:
+                revealLog(log) ## solo se desencriptan los passwords que se muestran
+                row = [
+                    str(log.logID),
+                    log.service,
+                    log.user,
+                    log.email,
+                    log.password,
+                    str(log.tags),
+                    log.createdAt,
+                ]
+                table.add_row(*([profile] if all_profiles else []), *row)
     
-        console.print(table)
+            Console().print(table)
         
     except NoLogFoundError : return typer.secho("No logs found", fg ="red")
 
+@log_app.command("pick")
+@require_active_session
+def pick(query : str = typer.Argument("", help="Text to start the search with")):
+    import sys
+    from keybin.core import getLogFile, revealLog
+    from keybin.picker import pickLog
+    if not sys.stdin.isatty() or not sys.stdout.isatty():
+        return typer.secho("ERROR: log pick needs an interactive terminal, use log find instead.", fg="red")
+    
+    log = pickLog(getLogFile(), query) ## el vault se carga una vez, cada tecla filtra en memoria
+    if log is None:
+        return
+    password = revealLog(log.copy()).password ## solo se desencripta el elegido
+    if not password:
+        return typer.secho(f"Log {log.logID} has no password.", fg="yellow")
+    import pyperclip
+    try:
+        pyperclip.copy(password)
+    except pyperclip.PyperclipException as e:
+        return typer.secho(f"ERROR: Couldn't copy to the clipboard: {e}", fg="red")
+    typer.secho(f"Password for {log.service or log.logID} copied to the clipboard.", fg="green")
+
+def _findAllProfiles(search, service, username, email, tags, id, limit):
+    from keybin.core import searchAllProfiles
+    
+    results, skipped = searchAllProfiles(search, service, username, email, tags, id, limit, _askProfileKeys())
+    _reportSkipped(skipped)
+    return results
+
+def _askProfileKeys():
+    from keybin.core import getConfig
+    
+    config = getConfig()
+    keys = {}
+    for name, profile in config.profiles.items(): ## el perfil activo usa su sesion, los demas piden su masterkey
+        if profile.encrypted and name != config.active_profile:
+            key = typer.prompt(f"Masterkey for '{name}' (empty to skip)", hide_input=True, default="", show_default=False)
+            if key : keys[name] = key
+    return keys
+
+def _reportSkipped(skipped : dict[str, str]):
+    for name, reason in skipped.items():
+        typer.secho(f"Skipped '{name}': {reason}", fg="yellow", err=True)
+
+@log_app.command("audit")
+@require_active_session
+def audit(
+    all_profiles : bool = typer.Option(False, "--all-profiles", "-A", help="Audit every profile, asking for the masterkey of the encrypted ones."),
+    json_output : bool = typer.Option(False, "--json", help="Print the report as JSON.")
+):
+    from rich.console import Console
+    from rich.table import Table
+    from keybin.audit import auditProfiles
+    
+    report, skipped = auditProfiles(all_profiles, _askProfileKeys() if all_profiles else None)
+    _reportSkipped(skipped)
+    if json_output:
+        import json
+        return typer.echo(json.dumps(report, indent=2))
+    
+    def label(entry):
+        name = f"{entry['profile']}/" if all_profiles else ""
+        return f"{name}{entry['logID']} {entry['service'] or ''}".strip()
+    
+    console = Console()
+    for title, groups, style in (("Reused passwords", report["reused"], "red"), ("Similar passwords", report["similar"], "yellow")):
+        if not groups:
+            continue
+        table = Table(title=title)
+        table.add_column("Logs", justify="right", style=style)
+        table.add_column("IDs and services")
+        for group in sorted(groups, key=len, reverse=True):
+            table.add_row(str(len(group)), ", ".join(label(entry) for entry in group))
+        console.print(table)
+    
+    if report["weak"]:
+        table = Table(title="Weak passwords")
+        if all_profiles : table.add_column("Profile", style="bright_white")
+        table.add_column("ID", justify="right", style="cyan")
+        table.add_column("Service", style="magenta")
+        table.add_column("Problems", style="red")
+        for entry in report["weak"]:
+            row = [str(entry["logID"]), entry["service"] or "", ", ".join(entry["reasons"])]
+            table.add_row(*([entry["profile"]] if all_profiles else []), *row)
+        console.print(table)
+    
+    reused = sum(len(group) for group in report["reused"])
+    similar = sum(len(group) for group in report["similar"])
+    problems = reused or similar or report["weak"]
+    typer.secho(f"{report['checked']} passwords checked: {reused} reused, {similar} similar to another, {len(report['weak'])} weak.", fg="yellow" if problems else "green")
+
+
 @log_app.command()
 @require_active_session
 def delete(
     id : int = typer.Argument(None, help="ID from the log you want to delete. Not sure? check all logs info with 'keybin log find all'"),
     noPrompt : bool = typer.Option(False, "--no-prompt", "-n", help="If true, delete without asking.")
     ):
+    from keybin.core import doSearch, deleteLog
     
     if id is None:
         id_str = typer.prompt("Please enter the ID of the log to delete")
@@ -111,4 +214,109 @@ def delete(
             return typer.secho("ERROR: No log found with this id", fg = "red")
     else : 
         typer.secho("Operation cancelled", fg="red")
-        typer.Exit()        
\ No newline at end of file
+        typer.Exit()        
+
+@log_app.command("import")
+@require_active_session
+def importLogs(
+    file : str = typer.Argument("-", help="CSV or JSONL file to import. Use '-' to read from stdin."),
+    format : str = typer.Option("auto", "--format", "-f", help="auto, csv, jsonl, bitwarden, lastpass, chrome or 1password."),
+    dry_run : bool = typer.Option(False, "--dry-run", help="Check the file without saving anything."),
+    passphrase : str = typer.Option(None, "--passphrase", help="Passphrase of an archive made with 'log export --encrypt'. Asked for if needed."),
+    autopass : bool = typer.Option(False, "--autopass", "-a", help="Give a new secure password to the rows that don't have one.")
+    ):
+    import sys
+    from itertools import chain
+    from keybin.transfer import iterImport, isArchiveHeader, iterArchiveContent
+    from keybin.passgen import iterSecureStrings
+    from keybin.vault import Vault
+    
+    newPasswords = iterSecureStrings() ## se generan de a tandas, solo si alguna fila los pide
+    imported = 0
+    errors : list[tuple[int, str]] = []
+    try:
+        stream = sys.stdin if file == "-" else open(file, encoding="utf-8-sig", newline="")
+    except OSError as e:
+        return typer.secho(f"ERROR: Couldn't open {file}: {e.strerror}.", fg="red")
+    try:
+        first = stream.readline()
+        lines = chain([first], stream)
+        if isArchiveHeader(first): ## export encriptado, se desencripta linea por linea
+            if not passphrase : passphrase = typer.prompt("Archive passphrase", hide_input=True)
+            lines = iterArchiveContent(lines, passphrase)
+        
+        with Vault() as vault: ## todo entra en memoria y se guarda con una sola escritura al final
+            for number, log, error in iterImport(lines, format):
+                if error:
+                    errors.append((number, error))
+                    continue
+                if autopass and not log.password : log.password = next(newPasswords)
+                vault.add(log.service, log.user, log.email, log.password, log.tags)
+                imported += 1
+                if imported % 1000 == 0:
+                    typer.echo(f"\r{imported} logs read...", err=True, nl=False)
+            if dry_run : vault.discard()
+    except (ValueError, InvalidPasswordError) as e:
+        return typer.secho(f"ERROR: {e}" if isinstance(e, ValueError) else str(e), fg="red")
+    finally:
+        if stream is not sys.stdin : stream.close()
+    
+    if imported >= 1000 : typer.echo("", err=True)
+    for number, error in errors:
+        typer.secho(f"Row {number}: {error}", fg="red", err=True)
+    
+    verb = "would be imported" if dry_run else "imported"
+    typer.secho(f"{imported} logs {verb}, {len(errors)} rows skipped.", fg="yellow" if errors else "green")
+
+
+@log_app.command("export")
+@require_active_session
+def export(
+    search: str = typer.Argument(None, help="Fuzzy search like 'log find'. Leave it empty to export every log."),
+    service: str = typer.Option(None, "--service", "-s"),
+    username: str = typer.Option(None, "--user", "-u", help="Exact match for username"),
+    email: str = typer.Option(None, "--email", "-e", help="Exact match for email"),
+    tags: list[str] = typer.Option([], "--tags", "-t", help="Only logs with all these tags."),
+    id: int = typer.Option(None, "--id", "-i", help="Exact match for ID"),
+    limit: int = typer.Option(None, "--limit", "-l", min=1, help="Only export the best K results"),
+    format: str = typer.Option("jsonl", "--format", "-f", help="jsonl or csv."),
+    output: str = typer.Option(None, "--output", "-o", help="File to write, stdout if not set."),
+    encrypt: bool = typer.Option(False, "--encrypt", help="Protect the export with a passphrase."),
+    passphrase: str = typer.Option(None, "--passphrase", help="Passphrase for --encrypt, asked for if not set.")
+    ):
+    import os, sys
+    from keybin.transfer import iterExportLines, iterArchiveLines, EXPORT_FORMATS
+    from keybin.vault import Vault
+    
+    if format not in EXPORT_FORMATS:
+        return typer.secho("ERROR: Format must be 'jsonl' or 'csv'.", fg="red")
+    if encrypt and not passphrase:
+        passphrase = typer.prompt("Archive passphrase", hide_input=True, confirmation_prompt=True)
+    
+    exported = 0
+    def counted(logs):
+        nonlocal exported
+        for log in logs:
+            exported += 1
+            yield log
+    
+    ## los logs se desencriptan y escriben de a uno, la memoria no crece con el vault
+    lines = iterExportLines(counted(Vault().iterFind(search, service, username, email, tags, id, limit)), format)
+    if encrypt:
+        lines = iterArchiveLines(lines, passphrase)
+    
+    if output:
+        ## el export tiene passwords, solo el usuario puede leerlo
+        descriptor = os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        stream = open(descriptor, "w", encoding="utf-8", newline="")
+    else:
+        stream = sys.stdout
+    
+    try:
+        for line in lines:
+            stream.write(line)
+    finally:
+        if stream is not sys.stdout : stream.close()
+    
+    if output:
+        typer.secho(f"{exported} logs exported to {output}", fg="green", err=True)
@@ -1,38 +1,55 @@
-from rich.console import Console
-from rich.table import Table
 from keybin.exceptions import *
 import typer
-from keybin.core import getConfig, startProfile, unlockDek, eraseProfileData, eraseToken, createToken, require_active_session
-from keybin.models import ConfigDataModel, ProfileModel
+from keybin.decorators import require_active_session
 
 profile_app = typer.Typer()
 
 
 @profile_app.command("list")
 def list():
-    config: ConfigDataModel = getConfig()
+    from rich.console import Console
+    from rich.table import Table
+    from keybin.core import getConfig
+    from keybin.kdf import describeKdf
+    config = getConfig()
     console = Console()
     table = Table(title="All profiles list")
 
     table.add_column("Profile name", style="cyan", no_wrap=True)
     table.add_column("Datapath", style="green")
     table.add_column("Encrypted", style="magenta")
+    table.add_column("KDF", style="dim")
 
     for profile_name, profile_data in config.profiles.items():
         encrypted_display = "Yes" if profile_data.encrypted else "No"
-        table.add_row(profile_name, profile_data.data_path, encrypted_display)
+        kdf_display = describeKdf(profile_data.kdf) if profile_data.encrypted else "-"
+        table.add_row(profile_name, profile_data.data_path, encrypted_display, kdf_display)
 
     console.print(table)
     
     
 @profile_app.command("add")
-def newProfile(user : str = typer.Option(None , "--user", "-u"), key : str = typer.Option(None, "--key", "-k"), path : str = typer.Option(None, "--path", "-p") ):
+def newProfile(
+    user : str = typer.Option(None , "--user", "-u"),
+    key : str = typer.Option(None, "--key", "-k"),
+    path : str = typer.Option(None, "--path", "-p"),
+    storage : str = typer.Option("file", "--storage", help="'file' rewrites the vault on every change, 'journal' appends changes and compacts them later."),
+    kdf : str = typer.Option("pbkdf2-sha256", "--kdf", help="'pbkdf2-sha256' or the memory-hard 'scrypt'."),
+    unlock_time : float = typer.Option(None, "--unlock-time", min=0.05, help="Tune the KDF so unlocking takes about this many seconds on this machine.") ):
+    from keybin.core import getConfig, startProfile, STORAGE_BACKENDS
+    from keybin.models import KdfParams
+    from keybin.kdf import KDF_ALGORITHMS, calibrateKdf
+    if storage not in STORAGE_BACKENDS:
+        return typer.secho(f"ERROR: Storage must be one of {', '.join(STORAGE_BACKENDS)}.", fg="red")
+    if kdf not in KDF_ALGORITHMS:
+        return typer.secho(f"ERROR: KDF must be one of {', '.join(KDF_ALGORITHMS)}.", fg="red")
     if not user : user = typer.prompt("Insert new profile name")
     if not key and typer.confirm(f"Add masterkey? (RECOMMENDED)"): key = typer.prompt("Insert new profile masterkey", hide_input=True)
     if not path and typer.confirm("Add custom path?"): path = typer.prompt("Insert custom path")
  
     try :
-        startProfile(user, key)
+        kdfParams = calibrateKdf(kdf, unlock_time) if key and unlock_time else KdfParams(algorithm=kdf)
+        startProfile(user, key, path, storage, kdfParams)
         typer.secho("Profile created correctly.", fg="green")
         if getConfig().active_profile:
             if typer.confirm(f"change to {typer.style(f"{user}", fg="yellow")}?"):
@@ -40,13 +57,20 @@ def newProfile(user : str = typer.Option(None , "--user", "-u"), key : str = typ
                 
     except ProfileAlreadyExistsError:
         typer.secho("ERROR: There's already a profile with this name, try another.", fg = "red")
+    except ValueError as e: ## parametros del kdf que no sirven en esta maquina
+        typer.secho(f"ERROR: {e}", fg = "red")
     
 
 @profile_app.command("switch")
 @require_active_session
-def switchProfile(user:str = typer.Argument(None, help="Profile to switch to"), key : str = typer.Argument(None, help="Masterkey for profile")):
+def switchProfile(
+    user:str = typer.Argument(None, help="Profile to switch to"),
+    key : str = typer.Argument(None, help="Masterkey for profile"),
+    agent : bool = typer.Option(True, help="Keep the vault unlocked in a background agent while the session lasts.") ):
+    from keybin.core import getConfig, unlockDek, eraseToken, createToken
+    from keybin.agent import startAgent
     
-    config : ConfigDataModel = getConfig()    
+    config = getConfig()    
     if not user : 
         user = typer.prompt("Select user:")
     if user not in config.profiles:
@@ -63,11 +87,59 @@ def switchProfile(user:str = typer.Argument(None, help="Profile to switch to"),
         
     eraseToken() ## eliminamos token anterior
     createToken(user, key) ## creamos nueva sesion
+    if agent : startAgent()
     typer.echo(f"{typer.style("Switched correctly to", fg="green")} {typer.style(f"{user}", fg="yellow")}")
     
     
+@profile_app.command("rekey")
+def rekey(
+    profile : str = typer.Argument(None, help="Profile to rekey, the active one if not set."),
+    kdf : str = typer.Option(None, "--kdf", help="'pbkdf2-sha256' or 'scrypt'. Keeps the current one if not set."),
+    unlock_time : float = typer.Option(None, "--unlock-time", min=0.05, help="Seconds unlocking should take on this machine (0.5 if not set)."),
+    iterations : int = typer.Option(None, "--iterations", min=1, help="Exact PBKDF2 iterations instead of calibrating."),
+    new_key : bool = typer.Option(False, "--new-key", help="Also change the masterkey.") ):
+    """
+    Wraps the profile's encryption key again with new KDF parameters. The vault itself isn't rewritten.
+    """
+    import time
+    from keybin.core import getConfig, rekeyProfile, unwrapDek
+    from keybin.models import KdfParams
+    from keybin.kdf import KDF_ALGORITHMS, DEFAULT_UNLOCK_TIME, calibrateKdf, describeKdf
+    
+    config = getConfig()
+    profile = profile or config.active_profile
+    if profile not in config.profiles:
+        return typer.secho("ERROR : This profile does not exist.", fg="red")
+    if not config.profiles[profile].encrypted:
+        return typer.secho("ERROR : This profile has no masterkey.", fg="red")
+    kdf = kdf or config.profiles[profile].kdf.algorithm
+    if kdf not in KDF_ALGORITHMS:
+        return typer.secho(f"ERROR: KDF must be one of {', '.join(KDF_ALGORITHMS)}.", fg="red")
+    if iterations and kdf != "pbkdf2-sha256":
+        return typer.secho("ERROR: --iterations only applies to pbkdf2-sha256.", fg="red")
+    
+    key = typer.prompt("Insert profile's masterkey", hide_input=True)
+    newKey = typer.prompt("Insert new masterkey", hide_input=True, confirmation_prompt=True) if new_key else None
+    
+    if iterations:
+        kdfParams = KdfParams(algorithm=kdf, iterations=iterations)
+    else:
+        typer.echo("Calibrating...")
+        kdfParams = calibrateKdf(kdf, unlock_time or DEFAULT_UNLOCK_TIME)
+    try:
+        userProfile = rekeyProfile(profile, key, newKey, kdfParams)
+    except InvalidPasswordError:
+        return typer.secho("ERROR : Incorrect masterkey.", fg="red")
+    
+    start = time.perf_counter()
+    unwrapDek(newKey or key, userProfile)
+    elapsed = time.perf_counter() - start
+    typer.secho(f"{profile} now uses {describeKdf(kdfParams)}, unlocking takes {elapsed:.2f}s.", fg="green")
+
+
 @profile_app.command("delete")
 def deleteProfile(profile: str = typer.Argument(None)):
+    from keybin.core import getConfig, unlockDek, eraseProfileData, eraseToken
         
     config = getConfig()
     if not profile : profile = typer.prompt("Input a profile to delete")
@@ -0,0 +1,30 @@
+import typer
+from keybin.decorators import require_active_session
+
+vault_app = typer.Typer()
+
+
+@vault_app.command("compact")
+@require_active_session
+def compact():
+    from keybin.core import compactJournal
+    if not compactJournal():
+        return typer.secho("The active profile doesn't use journal storage, nothing to compact.", fg="yellow")
+    typer.secho("Journal compacted into the vault snapshot.", fg="green")
+
+
+@vault_app.command("sync")
+@require_active_session
+def sync(
+    path : str = typer.Argument(..., help="Another copy of the active profile's vault"),
+    dryRun : bool = typer.Option(False, "--dry-run", help="Show what would change without saving"),
+):
+    from keybin.sync import syncWith
+    from keybin.exceptions import KeybinError
+    try:
+        (addedHere, deletedHere), (addedThere, deletedThere) = syncWith(path, dryRun)
+    except KeybinError as e:
+        return typer.secho(str(e), fg="red")
+    verb = "would get" if dryRun else "got"
+    typer.secho(f"This vault {verb} {addedHere} new or updated logs and {deletedHere} deletions.", fg="green")
+    typer.secho(f"{path} {verb} {addedThere} new or updated logs and {deletedThere} deletions.", fg="green")
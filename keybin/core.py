@@ -1,34 +1,56 @@
-import secrets, string, json, os, keyring, time, typer, base64
+import string, json, os, time, base64, hmac, heapq, atexit
 from .exceptions import *
-from thefuzz import fuzz
+from rapidfuzz import fuzz ## mismo partial_ratio que usa thefuzz, pero con score_cutoff
 from cryptography.fernet import Fernet, InvalidToken
-from hashlib import pbkdf2_hmac
-from keybin.models import passwordLog, ProfileModel, ConfigDataModel, LogsFileModel
+from hashlib import sha256
+from keybin.models import passwordLog, LogRecord, ProfileModel, ConfigDataModel, LogsFileModel, KdfParams
+from keybin.kdf import deriveKek
+from keybin.indexes import indexLog, unindexLog, lookupIds, FUZZY_SCORE_THRESHOLD
+from keybin.columns import getColumns
 from datetime import datetime, timezone
 from pathlib import Path
 from platformdirs import user_data_dir, user_config_path
-from functools import wraps
+from itertools import islice
+from keybin.passgen import newSecureString
+from keybin.decorators import require_active_session
+from keybin.agent import agentRequest, stopAgent
+from keybin.timings import span, count
+from keybin.vaultfile import isVaultFile, encodeVault, decodeVault, decodeLegacy, readGeneration, newUid, legacyUid, HEADER_SIZE, decryptBytes as _decrypt
+from keybin.locking import fileLock, atomicWrite, getLockPath
+from keybin.sessions import SessionStore, SESSION_STORES
 
 
 CONFIG_PATH = user_config_path("configs", "keybin")
 DEFAULT_STORAGE_PATH = user_data_dir("data", "keybin")
 SESSION_TIME = 900 ## 15 minutos x ahi
+STORAGE_BACKENDS = ("file", "journal")
+JOURNAL_MIN_COMPACT_BYTES = 64 * 1024 ## journals mas chicos q esto no se compactan solos
+
+_sessionDek : tuple[bytes, int] | None = None ## (dek, timestamp de la sesion) activa, el dek solo se usa mientras la sesion no vence
+_unlockedDeks : dict[str, tuple[bytes, bytes]] = {} ## user -> (huella de la key, dek), para no correr el kdf dos veces en el mismo comando
+_configCache : tuple[tuple, ConfigDataModel] | None = None ## (_configStamp, config) del ultimo config leido o guardado
+_sessionStore : SessionStore | None = None ## store fijado con setSessionStore, si no se usa el del config
+_stores : dict[str, SessionStore] = {}
+_sessionCache : dict[str, str | None] = {} ## user -> sesion leida o escrita por este proceso, el store se lee una vez por comando
+_pendingSessions : dict[str, str] = {} ## timestamps refrescados, se escriben una sola vez al salir
 
 
 def eraseToken():
+    global _sessionDek
     config : ConfigDataModel = getConfig()
     user = config.active_profile
     config.active_profile = ""
     saveConfig(config)
-    try:
-        keyring.delete_password("keybin_session", f"{user}")
-        return True
-    except keyring.errors.PasswordDeleteError:
-        return False
+    _sessionDek = None
+    _unlockedDeks.pop(user, None)
+    stopAgent() ## el agent tiene el dek en memoria, se va con la sesion
+    return _deleteSessionData(user)
 
-def createToken(user : string , key : str):
+def createToken(user : string , key : str, store : str | None = None):
     
     config = getConfig()
+    if store and store not in SESSION_STORES:
+        raise ValueError(f"Unknown session store '{store}'")
     
     if config.active_profile:
         raise SessionAlreadyExistsError("ERROR: There's an active session")
@@ -37,28 +59,85 @@ def createToken(user : string , key : str):
         raise UserNotFoundError("ERROR: Profile does not exist")
 
     profileKey = config.profiles[user].encrypted_dek
+    dek = b""
 
     if profileKey != '' :  
         if not key :
             raise PasswordNeededError("ERROR: Masterkey required for this profile")
-        if not unlockDek(key, user):
+        dek = unlockDek(key, user) ## unico kdf de la sesion, despues se usa el dek guardado
+        if not dek:
             raise InvalidPasswordError("ERROR: Invalid password")
     
 
     timestamp = int(time.time())
-    sessionToken = f"{key}:{timestamp}"
+    sessionToken = f"{dek.decode("utf-8")}:{timestamp}" ## guardamos el dek desenvuelto, no la masterkey
     config.active_profile = user
-    keyring.set_password("keybin_session", f"{user}", f"{sessionToken}")
+    if store : config.session_store = store
+    _setSessionData(user, sessionToken, store=getSessionStore(config.session_store))
     saveConfig(config)
 
 
-def tokenCheck():
+def setSessionStore(store : SessionStore | None):
+    """
+    Keeps this process' sessions in store instead of the one chosen at login. None goes back to the config's.
+    """
+    global _sessionStore
+    flushSessions()
+    _sessionStore = store
+    _sessionCache.clear()
+
+def getSessionStore(name : str | None = None):
+    if _sessionStore is not None:
+        return _sessionStore
+    name = name or getConfig().session_store
+    if name not in _stores:
+        _stores[name] = SESSION_STORES[name]()
+    return _stores[name]
+
+def _getSessionData(user : str, fresh : bool = False):
+    if not fresh and user in _sessionCache:
+        return _sessionCache[user]
+    sessionData = getSessionStore().get(user)
+    _sessionCache[user] = sessionData
+    return sessionData
+
+def _setSessionData(user : str, sessionData : str, deferred : bool = False, store : SessionStore | None = None):
+    _sessionCache[user] = sessionData
+    if deferred: ## solo cambia el timestamp, alcanza con escribirlo al salir
+        _pendingSessions[user] = sessionData
+        return
+    _pendingSessions.pop(user, None)
+    (store or getSessionStore()).set(user, sessionData)
+
+def _deleteSessionData(user : str):
+    _sessionCache.pop(user, None)
+    _pendingSessions.pop(user, None)
+    return getSessionStore().delete(user)
+
+@atexit.register
+def flushSessions():
+    """
+    Writes the session refreshes this process deferred. Runs on exit.
+    """
+    if not _pendingSessions:
+        return
+    pending = dict(_pendingSessions)
+    _pendingSessions.clear()
+    active = getConfig().active_profile
+    for user, sessionData in pending.items():
+        if user == active: ## si otro proceso cerro la sesion mientras tanto, no la revivimos
+            getSessionStore().set(user, sessionData)
+
+def tokenCheck(fresh : bool = False):
     
     config = getConfig()
     user = config.active_profile
-    session_data = keyring.get_password("keybin_session", f"{user}")
+    cached = not fresh and user in _sessionCache
+    session_data = _getSessionData(user, fresh)
     
     if not session_data or not user:
+        if cached and user: ## lo que leimos antes pudo quedar viejo
+            return tokenCheck(fresh=True)
         eraseToken()
         raise NoSessionActiveError("ERROR: Invalid or no session, try login in again.")
     
@@ -66,24 +145,42 @@ def tokenCheck():
         key, login_timestamp = session_data.split(":")
         login_timestamp = int(login_timestamp)
     except (ValueError, TypeError):
-        keyring.delete_password("keybin_session", f"{user}")
+        _deleteSessionData(user)
         eraseToken()
         raise CorruptedSessionError("ERROR: Session's corrrupted, please login again")
 
     if time.time() - login_timestamp > SESSION_TIME: ## chequeo si no murió ya la sesion
-        keyring.delete_password("keybin_session", f"{user}")
+        if cached: ## otro proceso pudo haberla refrescado despues de que la leimos
+            return tokenCheck(fresh=True)
+        _deleteSessionData(user)
         eraseToken()
         raise SessionExpiredError("ERROR: Session's expired")
     
-    return keyring.get_password("keybin_session", f"{user}")
+    return session_data ## ya lo leimos, no hace falta otra vuelta al store
 
 def getConfig():
+    """
+    Returns the config, parsing the file only when it changed since the last read.
+    """
+    global _configCache
     if not CONFIG_PATH.exists():
         createConfig()
+    
+    stat = os.stat(CONFIG_PATH)
+    if _configCache and _configCache[0] == _configStamp(stat):
+        return _configCache[1].model_copy(deep=True) ## copia, asi nadie modifica el cache sin guardar
         
-    with open(CONFIG_PATH, mode="r", encoding="utf-8") as read_file:
-        config = json.load(read_file)
-        return ConfigDataModel.model_validate(config) ## esto es para convertir de json al model
+    count("config_reads")
+    with fileLock(CONFIG_PATH):
+        stat = os.stat(CONFIG_PATH) ## pudo cambiar mientras esperabamos el lock
+        with open(CONFIG_PATH, mode="r", encoding="utf-8") as read_file:
+            config = ConfigDataModel.model_validate(json.load(read_file)) ## esto es para convertir de json al model
+    _configCache = (_configStamp(stat), config)
+    return config.model_copy(deep=True)
+
+def _configStamp(stat : os.stat_result):
+    ## atomicWrite deja un inodo nuevo en cada guardado, asi dos escrituras con el mismo mtime y tamaño no se confunden
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
     
     
 def createConfig():
@@ -99,55 +196,58 @@ def createConfig():
             }
         }
     }
-    Path(CONFIG_PATH).parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(CONFIG_PATH, mode="w", encoding="utf-8") as new_file:
-        json.dump(defaultConfig, new_file, indent=4)
+    with fileLock(CONFIG_PATH, exclusive=True):
+        if not CONFIG_PATH.exists(): ## otro proceso pudo crearlo mientras esperabamos
+            atomicWrite(CONFIG_PATH, json.dumps(defaultConfig, indent=4).encode("utf-8"))
 
-def startProfile(user : str, key : str, datapath : str | None = None):
+def startProfile(user : str, key : str, datapath : str | None = None, storage : str = "file", kdf : KdfParams | None = None):
     
     if datapath == None : datapath = str(Path(DEFAULT_STORAGE_PATH).joinpath(user)) 
+    if storage not in STORAGE_BACKENDS : raise ValueError(f"Unknown storage backend '{storage}'")
     
     if user in getConfig().profiles.keys(): raise ProfileAlreadyExistsError
     
     if key : ## si el usuario añadio una masterkey al profile tenemos q crear todo esto:
     
         dek = Fernet.generate_key()
-        saltBytes = os.urandom(16)
-        saltString = base64.b64encode(saltBytes).decode("utf-8")        
-        kek = pbkdf2_hmac("sha256", key.encode("utf-8"), saltBytes, 600000)
-        kekB64 = base64.urlsafe_b64encode(kek) ## la kek generada era de 32, pero fernet usa 64b asi q convertimos.
-        
-        f = Fernet(kekB64)
-        encryptedDekBytes = f.encrypt(dek)
-        encryptedDekString = encryptedDekBytes.decode("utf-8") 
+        kdf = kdf or KdfParams()
+        saltString, encryptedDekString = wrapDek(dek, key, kdf)
     
         profile = ProfileModel( ##son todos convertidos a string porque el model no acepta bytes, ademas los bytes no son json seriazables asi que seria otro lio.
             data_path = datapath,
             encrypted= True,
             salt= saltString,
             encrypted_dek = encryptedDekString,
+            storage = storage,
+            kdf = kdf,
         )
     else :  ## si no hay key tonces vacios los dos
         profile = ProfileModel(
             data_path = datapath,
             encrypted=False,
             salt= "",
-            encrypted_dek= ""
+            encrypted_dek= "",
+            storage = storage,
         )
     config : ConfigDataModel = getConfig()
     config.profiles[user] = profile
     saveConfig(config)
 
 def saveConfig(config : ConfigDataModel):
+    global _configCache
     
-    with open(CONFIG_PATH, mode="w", encoding="utf-8") as new_file:
-        json.dump(config.model_dump(), new_file, indent=4) ## esto es del model al json
+    with fileLock(CONFIG_PATH, exclusive=True):
+        atomicWrite(CONFIG_PATH, json.dumps(config.model_dump(), indent=4).encode("utf-8")) ## esto es del model al json
+        stat = os.stat(CONFIG_PATH) ## write-through, el proximo getConfig no vuelve a parsear
+    _configCache = (_configStamp(stat), config.model_copy(deep=True))
 
 def eraseProfileData(config : ConfigDataModel, profile : str):
     profileLogData= Path(config.profiles[profile].data_path)
     if profileLogData.exists():
         os.remove(profileLogData)
+    for extra in (getJournalPath(profileLogData), getLockPath(profileLogData)):
+        if extra.exists():
+            os.remove(extra)
     del config.profiles[profile]
     saveConfig(config)
 
@@ -164,66 +264,390 @@ def getUserProfile(user: str):
 def unlockDek(key : string, user : str):
     
     userProfile : ProfileModel = getUserProfile(user)
+    saltBytes = base64.b64decode(userProfile.salt)
+    
+    keyDigest = sha256(saltBytes + key.encode("utf-8")).digest()
+    cached = _unlockedDeks.get(user)
+    if cached and hmac.compare_digest(cached[0], keyDigest): ## misma key en este proceso, no hace falta otro kdf
+        return cached[1]
+    
+    dek = unwrapDek(key, userProfile)
+    _unlockedDeks[user] = (keyDigest, dek)
+    return dek
+
+def unwrapDek(key : string, userProfile : ProfileModel):
+    """
+    Runs the KDF and unwraps the profile's DEK, without reading the config or caching anything.
+    """
     saltString = userProfile.salt
     saltBytes = base64.b64decode(saltString) ## lo q estaba en el profile estaba encodeado en string, asi que volvemos a bytes pq si no no podemos generar la kek.
-    kek = pbkdf2_hmac("sha256", key.encode("utf-8"), saltBytes, 600000)
-    kekB64 = base64.urlsafe_b64encode(kek) ## la kek de 32 a 64 de vuelta
+    
+    kekB64 = deriveKek(key, saltBytes, userProfile.kdf)
     encryptedDekString = userProfile.encrypted_dek 
     encryptedDekBytes = encryptedDekString.encode("utf-8") ## dek de string a bytes
     
     f = Fernet(kekB64)
     try: ## intento con el kek ya cargado, desencriptar el dek en bytes encriptado.
-        return f.decrypt(encryptedDekBytes) ## para q podamos desencriptar archivos dsps
+        dek = _decrypt(f, encryptedDekBytes) ## para q podamos desencriptar archivos dsps
     except InvalidToken:
         raise InvalidPasswordError("ERROR: Password's not valid")
+    return dek
+
+def wrapDek(dek : bytes, key : str, kdf : KdfParams):
+    """
+    Encrypts the DEK with a KEK derived from key and a new salt. Returns (salt, encrypted DEK) as stored in the profile.
+    """
+    saltBytes = os.urandom(16)
+    f = Fernet(deriveKek(key, saltBytes, kdf))
+    return base64.b64encode(saltBytes).decode("utf-8"), f.encrypt(dek).decode("utf-8")
+
+def rekeyProfile(user : str, key : str, newKey : str | None = None, kdf : KdfParams | None = None):
+    """
+    Wraps the profile's DEK again with new KDF parameters and/or a new masterkey. The vault is encrypted
+    with the DEK, which doesn't change, so it isn't rewritten and open sessions keep working.
+    """
+    with fileLock(CONFIG_PATH, exclusive=True): ## que nadie guarde el config entre que lo leemos y lo reescribimos
+        config = getConfig()
+        if user not in config.profiles:
+            raise UserNotFoundError("ERROR: Profile does not exist")
+        userProfile = config.profiles[user]
+        if not userProfile.encrypted:
+            raise PasswordNeededError("ERROR: This profile has no masterkey to rekey")
+        
+        dek = unwrapDek(key, userProfile)
+        kdf = kdf or userProfile.kdf
+        userProfile.salt, userProfile.encrypted_dek = wrapDek(dek, newKey or key, kdf)
+        userProfile.kdf = kdf
+        saveConfig(config)
+    _unlockedDeks.pop(user, None)
+    return userProfile
+
+def getSessionDek():
+    """
+    Returns the DEK unwrapped at login, so encrypted commands don't run the KDF again.
+    Processes that live longer than the session (Vault, the agent) get SessionExpiredError once it expires.
+    """
+    global _sessionDek
+    fresh = False
+    if _sessionDek is not None and time.time() - _sessionDek[1] > SESSION_TIME:
+        _sessionDek = None
+        fresh = True ## otro proceso la pudo refrescar, si vencio de verdad tokenCheck tira SessionExpiredError
+    if _sessionDek is None:
+        sessionData = tokenCheck(fresh)
+        dekString, timestamp = sessionData.split(":")
+        dek = dekString.encode("utf-8")
+        try:
+            Fernet(dek)
+        except ValueError: ## sesiones viejas guardaban la masterkey en vez del dek
+            eraseToken()
+            raise CorruptedSessionError("ERROR: Session's corrrupted, please login again")
+        _sessionDek = (dek, int(timestamp))
+    return _sessionDek[0]
     
+def getJournalPath(path : Path):
+    return path.with_name(path.name + ".journal")
+
 def getLogFile():
     path = getActivePath()
     if not path.exists():
         createLogFile(path)
         
-    credential = keyring.get_credential("keybin_session", None)
-    userProfile = getUserProfile(credential.username)
-    
-    if userProfile.encrypted:
-        
-        key, timestamp = credential.password.split(":")
-        dek = unlockDek(key, credential.username)
-        f = Fernet(dek)
-        
+    userProfile = getUserProfile(getConfig().active_profile)
+    f = Fernet(getSessionDek()) if userProfile.encrypted else None
+    with span("load"):
+        return readLogFile(path, userProfile, f)
+
+def readLogFile(path : Path, userProfile : ProfileModel, f : Fernet | None, migrate : bool = True):
+    """
+    Loads the vault at path. f is the profile's DEK, None for profiles without masterkey.
+    Vaults in an older format are rewritten in the current one, unless migrate is False.
+    """
+    with fileLock(path): ## los lectores no se bloquean entre si, solo esperan a los que escriben
+        data = _readSnapshot(path)
+        if isVaultFile(data):
+            return _loadVault(path, userProfile, f, decodeVault(data, f))
+        if not migrate:
+            return _loadVault(path, userProfile, f, decodeLegacy(data, f))
+    
+    with span("migrate"), fileLock(path, exclusive=True): ## vault de antes del formato binario, se reescribe al toque
+        data = _readSnapshot(path)
+        if isVaultFile(data): ## otro proceso lo migro mientras esperabamos
+            return _loadVault(path, userProfile, f, decodeVault(data, f))
+        logFile = decodeLegacy(data, f)
+        _writeSnapshot(path, logFile, f)
+        return _loadVault(path, userProfile, f, logFile)
+
+def _readSnapshot(path : Path):
+    with span("read"):
         with open(path, mode="rb") as file:
-            decrypted = f.decrypt(file.read())        
-            return LogsFileModel.model_validate_json(decrypted)
-    else:  
-        with open(path, "r", encoding="utf-8") as file:
-            return LogsFileModel.model_validate_json(file.read())
-        
-    
+            return file.read()
+
+def _loadVault(path : Path, userProfile : ProfileModel, f : Fernet | None, logFile : LogsFileModel):
+    if userProfile.storage == "journal":
+        with span("journal replay"):
+            _replayJournal(logFile, getJournalPath(path), f)
+    logFile._stamp = _diskStamp(path)
+    return logFile
+
+def _diskStamp(path : Path):
+    """
+    (generation, journal size) of the vault on disk, changes whenever any process saves a change.
+    """
+    try:
+        with open(path, mode="rb") as file:
+            generation = readGeneration(file.read(HEADER_SIZE))
+    except FileNotFoundError:
+        return None
+    journal = getJournalPath(path)
+    return (generation, journal.stat().st_size if journal.exists() else 0)
+
+def _replayJournal(logFile : LogsFileModel, journalPath : Path, f : Fernet | None):
+    """
+    Applies the journal entries on top of the snapshot. Replaying twice gives the same result.
+    """
+    if not journalPath.exists():
+        return
+    
+    with open(journalPath, mode="rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"): ## append cortado a la mitad, lo ignoramos
+                break
+            entry = json.loads(_decrypt(f, line.strip()) if f else line)
+            if entry["op"] == "add":
+                log = LogRecord(**entry["log"], _seq=entry.get("seq", 0))
+                if log.uid is None: ## entrada de antes de sync
+                    log.uid, log.updatedAt = legacyUid(log.logID, log.service, log.user, log.email, log.createdAt), log.createdAt
+                if "password" in entry:
+                    if f : log._sealedPassword = entry["password"]
+                    else : log.password = entry["password"]
+                _addRecord(logFile, log)
+            elif entry["op"] == "delete":
+                if entry["logID"] is not None : _dropRecord(logFile, entry["logID"])
+                if "uid" in entry:
+                    logFile.tombstones[entry["uid"]] = [entry["version"], entry["updatedAt"], entry["seq"]]
+                    logFile.sequence = max(logFile.sequence, entry["seq"])
+            elif entry["op"] == "peer":
+                logFile.peers[entry["replicaId"]] = max(logFile.peers.get(entry["replicaId"], 0), entry["seq"])
+            elif entry["op"] == "ack":
+                logFile.acks[entry["replicaId"]] = max(logFile.acks.get(entry["replicaId"], 0), entry["seq"])
+                _pruneTombstones(logFile)
+
+def _addRecord(logFile : LogsFileModel, log : LogRecord):
+    """
+    Puts log in the vault and whatever in-memory indexes it has, replacing the log with the same ID.
+    """
+    old = logFile.logs.get(log.logID)
+    if old is not None:
+        if logFile.indexes : unindexLog(logFile.indexes, old)
+        if logFile._fuzzyIndex : logFile._fuzzyIndex.remove(old.logID)
+        if logFile._savedIndexes : logFile._savedIndexes.note(old)
+    logFile.logs[log.logID] = log
+    if logFile.indexes : indexLog(logFile.indexes, log) ## si todavia no se armaron, ya lo van a incluir
+    if logFile._fuzzyIndex : logFile._fuzzyIndex.add(log)
+    if logFile._columns : logFile._columns.add(log)
+    if logFile._savedIndexes : logFile._savedIndexes.note(log) ## el indice del archivo ya no lo tiene al dia
+    logFile.currentLogId = max(logFile.currentLogId, log.logID)
+    logFile.sequence = max(logFile.sequence, log._seq)
+    logFile.tombstones.pop(log.uid, None) ## solo llega aca si es mas nuevo que el borrado
+
+def _touch(logFile : LogsFileModel, log : LogRecord):
+    """
+    Marks log as changed in this vault, so the next sync sends it.
+    """
+    logFile.sequence += 1
+    log._seq = logFile.sequence
+
+def _buryRecord(logFile : LogsFileModel, logID : int | None, uid : str, version : int, updatedAt : str):
+    """
+    Leaves the tombstone of a deleted log, so sync deletes it in the other copies too. Returns the delete entry.
+    """
+    logFile.sequence += 1
+    logFile.tombstones[uid] = [version, updatedAt, logFile.sequence]
+    return {"op" : "delete", "logID" : logID, "uid" : uid, "version" : version, "updatedAt" : updatedAt, "seq" : logFile.sequence}
+
+def _pruneTombstones(logFile : LogsFileModel):
+    """
+    Drops the tombstones every peer already saw. Those peers deleted the log too, so the tombstone
+    can't stop anything anymore. A vault that never synced keeps them all, for its first sync.
+    """
+    if not logFile.peers:
+        return
+    seen = min(logFile.acks.get(replicaId, 0) for replicaId in logFile.peers)
+    for uid in [uid for uid, stone in logFile.tombstones.items() if stone[2] <= seen]:
+        del logFile.tombstones[uid]
+
+def _dropRecord(logFile : LogsFileModel, logID : int):
+    log = logFile.logs.pop(logID, None)
+    if log is None:
+        return None
+    if logFile.indexes : unindexLog(logFile.indexes, log)
+    if logFile._fuzzyIndex : logFile._fuzzyIndex.remove(logID)
+    if logFile._savedIndexes : logFile._savedIndexes.note(log)
+    if logFile._columns:
+        logFile._columns.remove(logID)
+        logFile._columns = logFile._columns.compact(logFile.logs)
+    return log
+    
+def emptyLogFile():
+    """
+    The vault of a profile that has no logs yet.
+    """
+    return LogsFileModel(currentLogId=0, logs={}, replicaId=newUid())
+
 def createLogFile(path : Path):
-    defaultFile = LogsFileModel(currentLogId=0,logs={})
+    defaultFile = emptyLogFile()
     path.parent.mkdir(parents=True, exist_ok=True)
-    saveLogFile(defaultFile)
+    with fileLock(path, exclusive=True):
+        if not path.exists(): ## otro proceso pudo crearlo mientras esperabamos
+            saveLogFile(defaultFile)
     
 def saveLogFile(logFile : LogsFileModel):
-    path = getActivePath()
-    credential = keyring.get_credential("keybin_session", None)
-    userProfile = getUserProfile(credential.username)
-    
-    if userProfile.encrypted:
-    
-        key, timestamp = credential.password.split(":")
-        dek = unlockDek(key, credential.username)
-        f = Fernet(dek)
-        dataString = logFile.model_dump_json()
-        dataBytes = dataString.encode("utf-8")
-        encryptedDataBytes = f.encrypt(dataBytes)
+    """
+    Rewrites the whole vault. For journal profiles this also folds the journal into the snapshot.
+    """
+    userProfile = getUserProfile(getConfig().active_profile)
+    with span("save"):
+        writeLogFile(getActivePath(), logFile, Fernet(getSessionDek()) if userProfile.encrypted else None)
+
+def writeLogFile(path : Path, logFile : LogsFileModel, f : Fernet | None):
+    """
+    saveLogFile for any profile's vault. f is the profile's DEK, None for profiles without masterkey.
+    Overwrites whatever is on disk, use commitChanges to keep changes saved by other processes.
+    """
+    with fileLock(path, exclusive=True):
+        _writeSnapshot(path, logFile, f)
+        journal = getJournalPath(path)
+        if journal.exists(): ## el snapshot ya tiene todo lo del journal
+            os.remove(journal)
+        logFile._stamp = _diskStamp(path)
+
+def _writeSnapshot(path : Path, logFile : LogsFileModel, f : Fernet | None):
+    stamp = _diskStamp(path)
+    logFile._generation = max(logFile._generation, stamp[0] if stamp else 0) + 1
+    atomicWrite(path, encodeVault(logFile, f, lambda log: _sealPassword(log, f), logFile._generation))
+
+def commitChanges(path : Path, userProfile : ProfileModel, f : Fernet | None, logFile : LogsFileModel, entries : list[dict]):
+    """
+    Saves changes already applied to logFile, described as {"op" : "add", "log" : log},
+    {"op" : "delete", "logID" : id, ...tombstone}, {"op" : "peer", "replicaId", "seq"} and
+    {"op" : "ack", "replicaId", "seq"} entries. If another process saved the vault after logFile was
+    read, logFile is reloaded and the entries applied again on top, so no one's changes get lost.
+    New logs can get a different ID in that case.
+    """
+    with fileLock(path, exclusive=True):
+        if _diskStamp(path) != logFile._stamp:
+            with span("merge"):
+                _reloadVault(logFile, path, userProfile, f)
+                entries = _applyEntries(logFile, entries)
         
-        with open(path, "wb") as new_file:
-            new_file.write(encryptedDataBytes)
-    else:
-        with open(path, "w", encoding="utf-8") as file:
-            json_string = logFile.model_dump_json(indent=4)
-            file.write(json_string)
+        if userProfile.storage != "journal" or not path.exists():
+            return writeLogFile(path, logFile, f)
+        
+        with span("journal append"):
+            _appendJournal(path, f, entries)
+        ## compactar cuando el journal pesa mas que el snapshot deja el costo amortizado en O(1) por cambio
+        if getJournalPath(path).stat().st_size > max(path.stat().st_size, JOURNAL_MIN_COMPACT_BYTES):
+            writeLogFile(path, logFile, f)
+        logFile._stamp = _diskStamp(path)
+
+def _reloadVault(logFile : LogsFileModel, path : Path, userProfile : ProfileModel, f : Fernet | None):
+    fresh = readLogFile(path, userProfile, f) if path.exists() else LogsFileModel(currentLogId=0, logs={}, replicaId=logFile.replicaId)
+    logFile.currentLogId = fresh.currentLogId
+    logFile.logs = fresh.logs
+    logFile.replicaId = fresh.replicaId
+    logFile.sequence = fresh.sequence
+    logFile.peers = fresh.peers
+    logFile.tombstones = fresh.tombstones
+    logFile.acks = fresh.acks
+    logFile.indexes = None ## los indices se rearman cuando hagan falta
+    logFile._fuzzyIndex = None
+    logFile._columns = fresh._columns
+    logFile._savedIndexes = fresh._savedIndexes
+    logFile._generation = fresh._generation
+    logFile._stamp = fresh._stamp
+
+def _applyEntries(logFile : LogsFileModel, entries : list[dict]):
+    """
+    Applies entries over a freshly loaded vault. Added logs get new IDs, the ones they had may be taken now.
+    Changes get a new seq too, other processes could have used the same ones. Acks are dropped for
+    the same reason, the next sync gives them again.
+    """
+    applied = []
+    newIDs = {}
+    for entry in entries:
+        if entry["op"] == "add":
+            log = entry["log"]
+            newIDs[log.logID] = logFile.currentLogId + 1
+            log.logID = newIDs[log.logID]
+            _touch(logFile, log)
+            _addRecord(logFile, log)
+            applied.append(entry)
+        elif entry["op"] == "delete":
+            logID = newIDs.get(entry["logID"], entry["logID"])
+            if logID is not None : _dropRecord(logFile, logID) ## si otro ya lo borro, queda igual
+            applied.append(_buryRecord(logFile, logID, entry["uid"], entry["version"], entry["updatedAt"]))
+        elif entry["op"] == "peer":
+            logFile.peers[entry["replicaId"]] = max(logFile.peers.get(entry["replicaId"], 0), entry["seq"])
+            applied.append(entry)
+    return applied
+
+def _appendJournal(path : Path, f : Fernet | None, entries : list[dict]):
+    journal = getJournalPath(path)
+    lines = []
+    for entry in entries:
+        if entry["op"] == "add":
+            log = entry["log"]
+            entry = {"op" : "add", "log" : log.asDict(exclude=("password",)), "password" : _sealPassword(log, f) if f else log.password, "seq" : log._seq}
+        line = json.dumps(entry).encode("utf-8")
+        lines.append((f.encrypt(line) if f else line) + b"\n")
+    
+    with open(journal, mode="ab+", opener=lambda name, flags: os.open(name, flags, 0o600)) as file:
+        size = file.seek(0, os.SEEK_END)
+        if size:
+            file.seek(size - 1)
+            if file.read(1) != b"\n": ## quedo un append cortado de antes, se descarta asi no se pega a la linea nueva
+                file.seek(0)
+                file.truncate(file.read().rfind(b"\n") + 1)
+        file.write(b"".join(lines))
+        file.flush()
+        os.fsync(file.fileno())
+
+def _sealPassword(log : LogRecord, f : Fernet):
+    """
+    Returns the log's password encrypted on its own. Passwords that were never revealed keep their ciphertext.
+    """
+    if log.password is None:
+        return log._sealedPassword
+    return f.encrypt(log.password.encode("utf-8")).decode("utf-8")
+
+def revealLog(log : LogRecord | passwordLog, f : Fernet | None = None):
+    """
+    Decrypts the log's password in place. Call it only for logs that are about to be shown or copied.
+    f defaults to the active session's DEK.
+    """
+    if log._sealedPassword is not None:
+        log.password = _decrypt(f or Fernet(getSessionDek()), log._sealedPassword.encode("utf-8")).decode("utf-8")
+        log._sealedPassword = None
+    return log
+
+def _persistChange(logFile : LogsFileModel, entry : dict):
+    """
+    Saves a single-log change: journal profiles append it, file profiles rewrite the vault.
+    """
+    userProfile = getUserProfile(getConfig().active_profile)
+    f = Fernet(getSessionDek()) if userProfile.encrypted else None
+    commitChanges(getActivePath(), userProfile, f, logFile, [entry])
+
+def compactJournal():
+    """
+    Folds the active profile's journal back into its snapshot. Returns False if the profile doesn't use a journal.
+    """
+    userProfile = getUserProfile(getConfig().active_profile)
+    if userProfile.storage != "journal":
+        return False
+    with fileLock(getActivePath(), exclusive=True): ## nadie agrega al journal entre que lo leemos y lo borramos
+        saveLogFile(getLogFile())
+    return True
 
 def newLog(
     service : str | None = None, 
@@ -232,126 +656,236 @@ def newLog(
     password : str | None = None,
     tags : list[str] | None = None):
     
-    logFile : LogsFileModel = getLogFile()
-    newLogID = logFile.currentLogId + 1 
-    log = passwordLog(logID = newLogID, service=service, user=user, email=email, password=password, tags=tags, createdAt=datetime.now(timezone.utc).isoformat())
-    logFile.currentLogId = newLogID
-    logFile.logs[newLogID] = log
-    saveLogFile(logFile)
+    with span("agent"):
+        response = agentRequest("add", service=service, user=user, email=email, password=password, tags=tags)
+    if response is not None:
+        return
+    insertLog(getLogFile(), service, user, email, password, tags)
+
+def insertLog(
+    logFile : LogsFileModel,
+    service : str | None = None, 
+    user : str | None = None,
+    email : str | None = None,
+    password : str | None = None,
+    tags : list[str] | None = None,
+    save : bool = True):
+    """
+    newLog over an already loaded vault, keeps its indexes in sync and saves the change unless save is False.
+    """
+    createdAt = datetime.now(timezone.utc).isoformat()
+    log = LogRecord(logFile.currentLogId + 1, service, user, email, password, tags, createdAt, uid=newUid(), updatedAt=createdAt)
+    _touch(logFile, log)
+    _addRecord(logFile, log)
+    if save : _persistChange(logFile, {"op" : "add", "log" : log})
+    return log
     
 def deleteLog(id : int, noPrompt : bool) :
-    logFile = getLogFile()
+    with span("agent"):
+        response = agentRequest("delete", id=id)
+    if response is not None:
+        return
+    removeLog(getLogFile(), id)
+
+def removeLog(logFile : LogsFileModel, id : int, save : bool = True):
+    """
+    deleteLog over an already loaded vault. Returns the delete entry, for callers that save it themselves.
+    """
     if not logFile.logs.get(id) :
         raise NoLogFoundError("ERROR: No log with this ID.")
     
-    logFile.logs.pop(id)
-    saveLogFile(logFile)    
-        
+    log = _dropRecord(logFile, id)
+    entry = _buryRecord(logFile, id, log.uid, log.version + 1, datetime.now(timezone.utc).isoformat())
+    if save : _persistChange(logFile, entry)
+    return entry
         
-def newSecureString(symbols : bool = True, length : int = 16):
-    
-    chars = string.ascii_letters + string.digits
-    if symbols : chars += string.punctuation
-    newpass = "".join(secrets.choice(chars) for _ in range(length))
-    return newpass 
         
-def doSearch(search : str | None = None , service : str | None = None ,username : str | None = None, email :str | None = None , tags : list[str] | None = None, id : int | None = None):
-    
-    profileLogFile : LogsFileModel = getLogFile()
-    logs_list: list[passwordLog] = profileLogFile.logs.values()  # lista ya con instancias
-    filtered_results : list [passwordLog]= []
+def doSearch(search : str | None = None , service : str | None = None ,username : str | None = None, email :str | None = None , tags : list[str] | None = None, id : int | None = None, limit : int | None = None):
+    with span("agent"):
+        response = agentRequest("find", search=search, service=service, username=username, email=email, tags=tags, id=id, limit=limit)
+    if response is not None: ## el agent ya tiene el vault abierto
+        return [LogRecord(**log) for log in response["logs"]]
+    logFile = getLogFile()
+    with span("search"):
+        return searchLogFile(logFile, search, service, username, email, tags, id, limit)
+
+def searchAllProfiles(search : str | None = None , service : str | None = None ,username : str | None = None, email :str | None = None , tags : list[str] | None = None, id : int | None = None, limit : int | None = None, keys : dict[str, str] | None = None):
+    """
+    doSearch over every profile at once. Each profile is unlocked and searched in its own process, so
+    it takes about as long as the slowest profile. The active profile uses its session, other encrypted
+    profiles need their masterkey in keys.
+    Returns (results, skipped): (profile, log) pairs best first with the passwords already revealed,
+    and {profile : reason} for the profiles that couldn't be searched.
+    """
+    config = getConfig()
+    keys = keys or {}
+    query = {"search" : search, "service" : service, "username" : username, "email" : email, "tags" : tags, "id" : id, "limit" : limit}
+    jobs : dict[str, tuple] = {}
+    skipped : dict[str, str] = {}
+    for name, userProfile in config.profiles.items():
+        dek = None
+        if userProfile.encrypted and not keys.get(name):
+            if name != config.active_profile:
+                skipped[name] = "masterkey needed"
+                continue
+            dek = getSessionDek() ## la sesion ya tiene el dek, el proceso no corre el kdf
+        jobs[name] = (name, userProfile, dek, keys.get(name), query)
+    
+    found : dict[str, list] = {}
+    with span("search all"):
+        if len(jobs) == 1: ## un solo perfil no justifica levantar procesos
+            outcomes = [_runProfileSearch(*job) for job in jobs.values()]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as pool:
+                outcomes = list(pool.map(_runProfileSearch, *zip(*jobs.values())))
+    for name, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, str):
+            skipped[name] = outcome
+        else:
+            found[name] = outcome
+    count("profiles_searched", len(found))
+    
+    ## se mezcla por puntaje, a igual puntaje el orden de los perfiles y despues el de cada vault
+    order = {name : position for position, name in enumerate(config.profiles)}
+    merged = [(name, position, score, log) for name, results in found.items() for position, (log, score) in enumerate(results)]
+    merged.sort(key=lambda item: (-(item[2] or 0), order[item[0]], item[1]))
+    return [(name, LogRecord(**log)) for name, position, score, log in islice(merged, limit)], skipped
+
+def _runProfileSearch(name : str, userProfile : ProfileModel, dek : bytes | None, key : str | None, query : dict):
+    """
+    Worker of searchAllProfiles. Returns the (log as dict, score) pairs found, or the error as a string
+    so one bad profile doesn't stop the others.
+    """
+    try:
+        f = None
+        if userProfile.encrypted:
+            f = Fernet(dek or unwrapDek(key, userProfile))
+        path = Path(userProfile.data_path)
+        if not path.exists():
+            return []
+        try:
+            results = searchLogFile(readLogFile(path, userProfile, f), scored=True, **query)
+        except NoLogFoundError:
+            return []
+        return [(revealLog(log, f).asDict(), score) for log, score in results] ## el vault es de este proceso, se revela en el lugar
+    except KeybinError as e:
+        return str(e)
+    except Exception as e:
+        return f"ERROR: {e}"
+
+def searchLogFile(profileLogFile : LogsFileModel, search : str | None = None , service : str | None = None ,username : str | None = None, email :str | None = None , tags : list[str] | None = None, id : int | None = None, limit : int | None = None, scored : bool = False):
+    """
+    doSearch over an already loaded vault. The exact filters use the in-memory indexes when someone
+    already built them, otherwise the ones saved in the file, and scan the columns for vaults without them.
+    With a limit only the best `limit` results are kept. With scored it returns (log, score) pairs, the score is None when there was no fuzzy search.
+    """
+    logs = profileLogFile.logs
+    logs_list: list[LogRecord] = logs.values()  # lista ya con instancias
 
     if search == "all": 
-        return logs_list
+        results = list(islice(logs_list, limit)) if limit else logs_list
+        return _unscored(results) if scored else results
     
-    for log in logs_list:
-        passes = True
-
-        if id and log.logID != id :
-            passes = False
-
-        if service and log.service != service:
-            passes = False
-
-        if username and log.user != username:
-            passes = False
-
-        if email and log.email != email:
-            passes = False
-        
-        if tags:
-            if not log.tags or not all(tag in log.tags for tag in tags):
-                passes = False
-
-        if passes:
-            filtered_results.append(log)
+    if profileLogFile.indexes:
+        ids = lookupIds(profileLogFile.indexes, service, username, email, tags)
+    elif profileLogFile._savedIndexes:
+        ids = profileLogFile._savedIndexes.lookup(logs, service, username, email, tags)
+    else:
+        ids = getColumns(profileLogFile).filterIds(service, username, email, tags)
+    if id:
+        ids = {id} if ids is None else ids & {id}
+    
+    if search and profileLogFile._fuzzyIndex: ## con indice solo se puntuan los valores que pueden pasar el threshold
+        scores = profileLogFile._fuzzyIndex.search(search.lower())
+        matched = sorted(scores) if ids is None else sorted(ids & scores.keys())
+        scored_results = [(logs[logID], scores[logID]) for logID in matched if logID in logs]
+        if limit:
+            scored_results = heapq.nlargest(limit, scored_results, key=lambda item: item[1])
+        else:
+            scored_results.sort(key=lambda item: item[1], reverse=True)
+        return scored_results if scored else [log for log, score in scored_results]
+    
+    if search and ids is None: ## todo el vault, se puntua columna por columna
+        columns = getColumns(profileLogFile)
+        ranked = sorted(columns.fuzzyScores(search).items(), key=lambda item: (-item[1], item[0])) ## a igual puntaje, el orden del vault
+        scored_results = [(logs[columns.ids[position]], score) for position, score in islice(ranked, limit)]
+        return scored_results if scored else [log for log, score in scored_results]
+    
+    if ids is None:
+        filtered_results : list [LogRecord] = list(logs_list)
+    else:
+        filtered_results = [logs[logID] for logID in sorted(ids) if logID in logs]
 
     
     if search : ## si hay search general, usamos los logs post filtro
-        return _fuzzySearch(search, filtered_results) 
+        return _fuzzySearch(search, filtered_results, limit, scored) 
     
     if filtered_results == [] : ## si no hay search y los resultados estan vacios
         raise NoLogFoundError("No results for this search")
     
     ##si no hay search y si hay resultados filtrados
-    return filtered_results
+    results = filtered_results[:limit] if limit else filtered_results
+    return _unscored(results) if scored else results
 
+def _unscored(logs):
+    return [(log, None) for log in logs]
 
-def _fuzzySearch(search : str, logs : list[passwordLog]):
-    SCORE_THRESHOLD = 75
-    scored_results = []
-    search_lower = search.lower()
 
-    for log in logs: ## buscar en todos los campos pq no sabemos q busca
+def _fuzzySearch(search : str, logs : list[LogRecord], limit : int | None = None, scored : bool = False):
+    SCORE_THRESHOLD = FUZZY_SCORE_THRESHOLD
+    search_lower = search.lower()
+    best : list[tuple[int, int, LogRecord]] = [] ## heap de (puntaje, -orden, log), con limit guarda solo los mejores
+    
+    for order, log in enumerate(logs): ## buscar en todos los campos pq no sabemos q busca
 
-        service = log.service.lower() if log.service else ""
-        user = log.user.lower() if log.user else ""
-        email = log.email.lower() if log.email else ""
-        tags = log.tags if log.tags else ""
+        fields = [log.service.lower() if log.service else "", log.user.lower() if log.user else "", log.email.lower() if log.email else ""]
+        fields.extend(log.tags or [])
         
-        score_service = fuzz.partial_ratio(search_lower, service)
-        score_user = fuzz.partial_ratio(search_lower, user)
-        score_email = fuzz.partial_ratio(search_lower, email)
+        ## un campo solo sirve si supera el threshold, lo mejor del log hasta ahora y (con el heap lleno) al peor del top
+        floor = SCORE_THRESHOLD
+        if limit and len(best) == limit:
+            floor = max(floor, best[0][0] + 1) ## a igual puntaje gana el que vino antes
         
-        score_tags = 0
-        for tag in tags:
-            newScore = fuzz.partial_ratio(search_lower, tag)
-            if newScore > score_tags : score_tags = newScore
+        max_score = 0
+        for field in fields:
+            raw = fuzz.partial_ratio(search_lower, field, score_cutoff=max(floor, max_score + 1) - 0.5) ## thefuzz redondea
+            score = int(round(raw))
+            if score > max_score : max_score = score
+            if max_score == 100 : break
         
-        max_score = max(score_service, score_user, score_email, score_tags, score_tags)
+        if max_score < floor: ## no pasa el threshold o no le gana al peor del top
+            continue
         
-        if max_score >= SCORE_THRESHOLD: ## puntaje pasa el threshold, tonces lo agregamos a los resultados con su puntaje
-            scored_results.append((log, max_score))
+        item = (max_score, -order, log)
+        if not limit:
+            best.append(item)
+        elif len(best) < limit:
+            heapq.heappush(best, item)
+        else:
+            heapq.heapreplace(best, item)
 
 
 ## hay q ordenar y filtrar
-    scored_results.sort(key=lambda item: item[1], reverse=True)
-    final_results = [log for log, score in scored_results]
+    best.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    if scored:
+        return [(log, score) for score, order, log in best]
+    final_results = [log for score, order, log in best]
     
     return final_results
 
 
 
-def require_active_session(func):
+def refreshToken():
     """
-    Checks token for secured commands.
+    Checks the session and restarts its timer, used by require_active_session.
     """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        try:
-            sessionData = tokenCheck() 
-            user = getConfig().active_profile
-            key, timestamp = sessionData.split(":")
-            newTimestamp = int(time.time())
-            newSessionData = f"{key}:{newTimestamp}"
-            keyring.set_password("keybin_session", user, newSessionData )
-            return func(*args, **kwargs)
-
-        except (NoSessionActiveError, SessionExpiredError, CorruptedSessionError) as e:
-            typer.secho(str(e), fg="red")
-            return
-        except Exception as e:
-            typer.secho(f"Unexpected error: {e}", fg="red")
-            return
-
-    return wrapper
\ No newline at end of file
+    global _sessionDek
+    sessionData = tokenCheck() 
+    user = getConfig().active_profile
+    key, timestamp = sessionData.split(":")
+    newTimestamp = int(time.time())
+    newSessionData = f"{key}:{newTimestamp}"
+    _setSessionData(user, newSessionData, deferred=True)
+    if _sessionDek is not None:
+        _sessionDek = (_sessionDek[0], newTimestamp)
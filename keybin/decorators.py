@@ -0,0 +1,24 @@
+import typer
+from functools import wraps
+from keybin.exceptions import NoSessionActiveError, SessionExpiredError, CorruptedSessionError
+
+
+def require_active_session(func):
+    """
+    Checks token for secured commands.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        from keybin.core import refreshToken ## core es pesado, se importa recien cuando corre el comando
+        try:
+            refreshToken()
+            return func(*args, **kwargs)
+
+        except (NoSessionActiveError, SessionExpiredError, CorruptedSessionError) as e:
+            typer.secho(str(e), fg="red")
+            return
+        except Exception as e:
+            typer.secho(f"Unexpected error: {e}", fg="red")
+            return
+
+    return wrapper
@@ -27,3 +27,6 @@ class NoLogFoundError(KeybinError):
 
 class ProfileAlreadyExistsError(KeybinError):
     pass
+
+class AgentError(KeybinError):
+    pass
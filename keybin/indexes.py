@@ -0,0 +1,332 @@
+import json, struct, zlib
+from functools import lru_cache
+from itertools import accumulate, repeat
+from thefuzz import fuzz
+from cryptography.fernet import InvalidToken
+from keybin.models import LogRecord, LogIndexesModel, LogsFileModel
+
+INDEXED_FIELDS = ("service", "user", "email")
+SAVED_FIELDS = INDEXED_FIELDS + ("tags",)
+BUCKET_VALUES = 256 ## valores por bucket en el indice guardado, una busqueda descomprime uno solo
+
+
+def buildIndexes(logs : dict[int, LogRecord]):
+    indexes = LogIndexesModel()
+    for log in logs.values():
+        indexLog(indexes, log)
+    return indexes
+
+def getIndexes(logFile : LogsFileModel):
+    """
+    Builds the in-memory exact indexes of a loaded vault, for callers that keep it loaded across
+    many searches. Single searches use the SavedIndexes that come in the file.
+    """
+    if logFile.indexes is None:
+        logFile.indexes = buildIndexes(logFile.logs)
+    return logFile.indexes
+
+def indexLog(indexes : LogIndexesModel, log : LogRecord):
+    for field in INDEXED_FIELDS:
+        value = getattr(log, field)
+        if value:
+            getattr(indexes, field).setdefault(value, []).append(log.logID)
+    for tag in dict.fromkeys(log.tags or []): ## sin tags repetidos
+        indexes.tags.setdefault(tag, []).append(log.logID)
+
+def unindexLog(indexes : LogIndexesModel, log : LogRecord):
+    for field in INDEXED_FIELDS:
+        _removeId(getattr(indexes, field), getattr(log, field), log.logID)
+    for tag in dict.fromkeys(log.tags or []):
+        _removeId(indexes.tags, tag, log.logID)
+
+def _removeId(index : dict[str, list[int]], value : str | None, logID : int):
+    ids = index.get(value)
+    if not ids or logID not in ids:
+        return
+    ids.remove(logID)
+    if not ids:
+        del index[value]
+
+def lookupIds(indexes : LogIndexesModel, service : str | None = None, user : str | None = None, email : str | None = None, tags : list[str] | None = None):
+    """
+    Returns the IDs matching every exact filter given, or None if no filter was given.
+    """
+    postings : list[list[int]] = []
+    for index, value in ((indexes.service, service), (indexes.user, user), (indexes.email, email)):
+        if value:
+            postings.append(index.get(value, []))
+    for tag in tags or []:
+        postings.append(indexes.tags.get(tag, []))
+    
+    if not postings:
+        return None
+    
+    postings.sort(key=len) ## arrancamos por la lista mas chica, asi el costo depende del resultado y no del vault
+    result = set(postings[0])
+    for ids in postings[1:]:
+        if not result : break
+        result.intersection_update(ids)
+    return result
+
+
+def _bucketOf(value : str, buckets : int):
+    return zlib.crc32(value.encode("utf-8")) % buckets ## hash() cambia en cada proceso
+
+def _fieldValues(log : LogRecord, field : str):
+    if field == "tags":
+        return dict.fromkeys(log.tags or ())
+    value = getattr(log, field)
+    return (value,) if value else ()
+
+def _sealBucket(bucket : dict, f):
+    data = zlib.compress(json.dumps(bucket, separators=(",", ":")).encode("utf-8"), 1) ## mismo nivel que las columnas del vault
+    return f.encrypt(data) if f else data
+
+def _fieldSection(blobs : list[bytes]):
+    return struct.pack(f">{len(blobs) + 2}I", len(blobs), *accumulate(map(len, blobs), initial=0)) + b"".join(blobs)
+
+def encodeSavedIndexes(columns : dict[str, list], logs : dict[int, LogRecord], f = None, saved : "SavedIndexes | None" = None):
+    """
+    Serializes the exact indexes for the vault file. For every field: the bucket count, the bucket
+    offsets and the buckets, each one a zlib-compressed JSON {value: logIDs}, encrypted when f is given.
+    columns are the vault's columns (logID, service, user, email and tags). With the SavedIndexes the
+    vault was read with, only the buckets its changed logs touched are encoded again.
+    """
+    ids = columns["logID"]
+    count = max(1, len(ids) // BUCKET_VALUES)
+    if saved is not None and saved.reusable(count, f):
+        return saved.updated(logs, f)
+    
+    parts = []
+    for field in SAVED_FIELDS:
+        index : dict[str, list[int]] = {}
+        if field == "tags":
+            for tags, logID in zip(columns["tags"], ids):
+                for tag in dict.fromkeys(tags or ()):
+                    index.setdefault(tag, []).append(logID)
+        else:
+            for value, logID in zip(columns[field], ids):
+                if value : index.setdefault(value, []).append(logID)
+        buckets : list[dict[str, list[int]]] = [{} for _ in range(count)]
+        for value, bucket in zip(index, map(_bucketOf, index, repeat(count))):
+            buckets[bucket][value] = index[value]
+        parts.append(_fieldSection([_sealBucket(bucket, f) if bucket else b"" for bucket in buckets]))
+    return b"".join(parts)
+
+class SavedIndexes:
+    """
+    The exact indexes saved in the vault file. A lookup only decodes the bucket of each value it asks
+    for, so its cost doesn't grow with the vault. Logs changed after the file was read (journal
+    entries, changes not saved yet) are noted in changed and checked one by one.
+    """
+    
+    def __init__(self, data : bytes, f = None):
+        self._data = data
+        self._f = f
+        self._fields : dict[str, tuple[int, tuple, int]] = {} ## campo -> (buckets, offsets, donde empiezan)
+        offset = 0
+        for field in SAVED_FIELDS:
+            (count,) = struct.unpack_from(">I", data, offset)
+            offsets = struct.unpack_from(f">{count + 1}I", data, offset + 4)
+            start = offset + 4 * (count + 2)
+            self._fields[field] = (count, offsets, start)
+            offset = start + offsets[-1]
+        self.changed : set[int] = set()
+        self._touched : dict[str, set[int]] = {field : set() for field in SAVED_FIELDS} ## buckets con logs de changed
+    
+    def note(self, log : LogRecord):
+        """
+        Marks log as changed since the file was read. Call it with the old version of the log and the new one.
+        """
+        self.changed.add(log.logID)
+        for field in SAVED_FIELDS:
+            count = self._fields[field][0]
+            self._touched[field].update(_bucketOf(value, count) for value in _fieldValues(log, field))
+    
+    def _blob(self, field : str, bucket : int):
+        count, offsets, start = self._fields[field]
+        return self._data[start + offsets[bucket]:start + offsets[bucket + 1]]
+    
+    def _bucket(self, field : str, bucket : int):
+        blob = self._blob(field, bucket)
+        if not blob:
+            return {}
+        if self._f : blob = self._f.decrypt(blob)
+        return json.loads(zlib.decompress(blob))
+    
+    def lookup(self, logs : dict[int, LogRecord], service : str | None = None, user : str | None = None, email : str | None = None, tags : list[str] | None = None):
+        """
+        Same as lookupIds. logs are the vault's current logs, the changed ones are read from there.
+        """
+        wanted = [(field, value) for field, value in zip(INDEXED_FIELDS, (service, user, email)) if value]
+        wanted.extend(("tags", tag) for tag in tags or [])
+        if not wanted:
+            return None
+        
+        postings = [self._bucket(field, _bucketOf(value, self._fields[field][0])).get(value, []) for field, value in wanted]
+        postings.sort(key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            if not result : break
+            result.intersection_update(ids)
+        result -= self.changed
+        for logID in self.changed:
+            log = logs.get(logID)
+            if log is not None and all(value in _fieldValues(log, field) for field, value in wanted):
+                result.add(logID)
+        return result
+    
+    def reusable(self, count : int, f):
+        """
+        Whether updated can encode the indexes of a vault that needs count buckets with f.
+        """
+        saved = self._fields["service"][0]
+        if not saved // 2 <= count <= saved * 2 or (f is None) != (self._f is None): ## muy lejos de BUCKET_VALUES, se rearma
+            return False
+        if f:
+            sample = next((blob for field in SAVED_FIELDS for bucket in range(self._fields[field][0]) if (blob := self._blob(field, bucket))), None)
+            try:
+                if sample : f.decrypt(sample)
+            except InvalidToken: ## otro dek, los buckets no se pueden copiar
+                return False
+        return True
+    
+    def _stripped(self, field : str, bucket : int):
+        stripped = {}
+        for value, ids in self._bucket(field, bucket).items():
+            ids = [logID for logID in ids if logID not in self.changed]
+            if ids : stripped[value] = ids
+        return stripped
+    
+    def updated(self, logs : dict[int, LogRecord], f = None):
+        """
+        The indexes of logs, copying every bucket without changed logs as it is.
+        """
+        parts = []
+        for field in SAVED_FIELDS:
+            count = self._fields[field][0]
+            edited = {bucket : self._stripped(field, bucket) for bucket in self._touched[field]}
+            for logID in self.changed:
+                log = logs.get(logID)
+                if log is None:
+                    continue
+                for value in _fieldValues(log, field):
+                    bucket = _bucketOf(value, count)
+                    if bucket not in edited : edited[bucket] = self._stripped(field, bucket)
+                    edited[bucket].setdefault(value, []).append(logID)
+            blobs = [self._blob(field, bucket) for bucket in range(count)]
+            for bucket, values in edited.items():
+                blobs[bucket] = _sealBucket(values, f) if values else b""
+            parts.append(_fieldSection(blobs))
+        return b"".join(parts)
+
+
+FUZZY_SCORE_THRESHOLD = 75
+
+
+def fuzzyFields(log : LogRecord):
+    """
+    Normalized fields that the fuzzy search scores, same rules as _fuzzySearch.
+    """
+    fields = [log.service.lower() if log.service else "", log.user.lower() if log.user else "", log.email.lower() if log.email else ""]
+    fields.extend(log.tags or [])
+    return tuple(field for field in fields if field)
+
+def _bigrams(text : str):
+    counts : dict[str, int] = {}
+    for gram in map(str.__add__, text, text[1:]):
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+@lru_cache(maxsize=None)
+def _preservedBigrams(needleLength : int):
+    """
+    Lower bound of bigrams a field must share with the query to reach the threshold in partial_ratio.
+    needleLength is the length of the shorter of the two strings, partial_ratio aligns it against
+    a window of at most that length.
+    """
+    ## con M caracteres en comun (LCS) y una ventana de largo w, se conservan al menos
+    ## (n-1) - 2(n-M) - (w-M) bigramas: cada borrado rompe 2, cada insercion rompe 1.
+    lowest = None
+    for window in range(1, needleLength + 1):
+        for matches in range(window + 1):
+            if 200 * matches / (needleLength + window) < FUZZY_SCORE_THRESHOLD - 0.5: ## thefuzz redondea el puntaje
+                continue
+            preserved = 3 * matches - needleLength - window - 1
+            if lowest is None or preserved < lowest:
+                lowest = preserved
+    return max(lowest or 0, 0)
+
+class FuzzyIndex:
+    """
+    Bigram index over the distinct values of the fuzzy searchable fields. Values that can't reach
+    FUZZY_SCORE_THRESHOLD are skipped without scoring, the rest are scored once with partial_ratio
+    no matter how many logs share them.
+    """
+    
+    def __init__(self, logs : dict[int, LogRecord] | None = None):
+        self._fields : dict[int, tuple[str, ...]] = {}
+        self._values : dict[str, set[int]] = {} ## valor normalizado -> logIDs que lo tienen
+        self._postings : dict[str, dict[str, int]] = {} ## bigrama -> {valor: veces que aparece}
+        self._byLength : dict[int, set[str]] = {}
+        for log in (logs or {}).values():
+            self.add(log)
+    
+    def add(self, log : LogRecord):
+        fields = fuzzyFields(log)
+        self._fields[log.logID] = fields
+        for value in fields:
+            owners = self._values.get(value)
+            if owners is None:
+                owners = self._values[value] = set()
+                for gram, count in _bigrams(value).items():
+                    self._postings.setdefault(gram, {})[value] = count
+                self._byLength.setdefault(len(value), set()).add(value)
+            owners.add(log.logID)
+    
+    def remove(self, logID : int):
+        for value in self._fields.pop(logID, ()):
+            owners = self._values.get(value)
+            if owners is None:
+                continue
+            owners.discard(logID)
+            if owners:
+                continue
+            del self._values[value]
+            for gram in _bigrams(value):
+                posting = self._postings[gram]
+                posting.pop(value, None)
+                if not posting : del self._postings[gram]
+            sameLength = self._byLength[len(value)]
+            sameLength.discard(value)
+            if not sameLength : del self._byLength[len(value)]
+    
+    def search(self, search : str):
+        """
+        Returns {logID: best score} for the logs scoring over the threshold. search must be normalized already.
+        """
+        shared : dict[str, int] = {}
+        for gram, queryCount in _bigrams(search).items():
+            for value, count in self._postings.get(gram, {}).items():
+                shared[value] = shared.get(value, 0) + min(queryCount, count)
+        
+        scores : dict[int, int] = {}
+        for length, values in self._byLength.items():
+            required = _preservedBigrams(min(length, len(search)))
+            for value in (values if required == 0 else (value for value in values if shared.get(value, 0) >= required)):
+                score = fuzz.partial_ratio(search, value)
+                if score < FUZZY_SCORE_THRESHOLD:
+                    continue
+                for logID in self._values[value]:
+                    if score > scores.get(logID, 0) : scores[logID] = score
+        return scores
+
+
+def getFuzzyIndex(logFile : LogsFileModel):
+    """
+    Builds the fuzzy index of a loaded vault once. Building it costs more than a single linear scan,
+    so it's meant for callers that keep the vault loaded across searches.
+    """
+    if logFile._fuzzyIndex is None:
+        logFile._fuzzyIndex = FuzzyIndex(logFile.logs)
+    return logFile._fuzzyIndex
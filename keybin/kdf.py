@@ -0,0 +1,64 @@
+"""
+Key derivation for the profiles' masterkeys.
+
+Each profile keeps the KDF it was created with in its KdfParams, so the cost can be tuned per host
+(and moved to the memory-hard scrypt) without touching the vault: the KEK only wraps the DEK.
+calibrateKdf picks parameters that take about a given time on the current machine.
+"""
+import base64, hashlib, time
+from keybin.models import KdfParams
+from keybin.timings import span, count
+
+KDF_ALGORITHMS = ("pbkdf2-sha256", "scrypt")
+MIN_ITERATIONS = 100000 ## por debajo de esto no se calibra, aunque la maquina sea muy lenta
+MIN_SCRYPT_N = 2 ** 14
+MAX_SCRYPT_N = 2 ** 20 ## 1 GiB con r=8
+DEFAULT_UNLOCK_TIME = 0.5 ## segundos, lo que calibra rekey si no se le pide otra cosa
+_PROBE_ITERATIONS = 20000
+
+
+def deriveKek(key : str, salt : bytes, params : KdfParams):
+    """
+    Returns the KEK for key as a Fernet key.
+    """
+    if params.algorithm not in KDF_ALGORITHMS:
+        raise ValueError(f"Unknown KDF '{params.algorithm}'")
+    with span("kdf"):
+        count("kdf_runs")
+        if params.algorithm == "scrypt":
+            kek = hashlib.scrypt(key.encode("utf-8"), salt=salt, n=params.n, r=params.r, p=params.p, maxmem=_scryptMemory(params) * 2, dklen=32)
+        else:
+            kek = hashlib.pbkdf2_hmac("sha256", key.encode("utf-8"), salt, params.iterations)
+    return base64.urlsafe_b64encode(kek) ## la kek generada era de 32, pero fernet usa 64b asi q convertimos.
+
+def describeKdf(params : KdfParams):
+    if params.algorithm == "scrypt":
+        return f"scrypt (n=2^{params.n.bit_length() - 1}, r={params.r}, p={params.p})"
+    return f"{params.algorithm} ({params.iterations} iterations)"
+
+def _scryptMemory(params : KdfParams):
+    return 128 * params.r * params.n * params.p
+
+def _timeKdf(params : KdfParams):
+    start = time.perf_counter()
+    deriveKek("calibration", b"\0" * 16, params)
+    return time.perf_counter() - start
+
+def calibrateKdf(algorithm : str = "pbkdf2-sha256", target : float = DEFAULT_UNLOCK_TIME):
+    """
+    KdfParams for algorithm that take about target seconds to unlock on this machine.
+    """
+    if algorithm not in KDF_ALGORITHMS:
+        raise ValueError(f"Unknown KDF '{algorithm}'")
+    if algorithm == "pbkdf2-sha256": ## el costo es lineal en las iteraciones, alcanza con medir una corrida chica
+        perIteration = _timeKdf(KdfParams(iterations=_PROBE_ITERATIONS)) / _PROBE_ITERATIONS
+        iterations = round(target / perIteration, -4)
+        return KdfParams(algorithm=algorithm, iterations=max(MIN_ITERATIONS, int(iterations)))
+
+    ## scrypt solo acepta n potencia de 2, se duplica mientras la siguiente quede mas cerca del objetivo
+    params = KdfParams(algorithm=algorithm, n=MIN_SCRYPT_N)
+    elapsed = _timeKdf(params)
+    while params.n < MAX_SCRYPT_N and elapsed * 2 - target < target - elapsed:
+        params.n *= 2
+        elapsed = _timeKdf(params) ## la memoria no escala lineal, se mide cada paso
+    return params
@@ -0,0 +1,103 @@
+"""
+File locks and atomic writes for the vault and config files.
+
+Every locked file gets a `<name>.lock` next to it. The data files themselves are replaced on every
+write, so a lock held on them would be lost with the old inode. Readers take a shared lock and run
+in parallel. Writers take an exclusive one, write to a temp file and rename it over the old one, so
+a crash never leaves a half written vault.
+"""
+import os, tempfile, threading
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from keybin.timings import span
+
+try:
+    import fcntl
+except ImportError: ## windows, no hay locks compartidos
+    fcntl = None
+    import msvcrt
+
+_local = threading.local() ## locks tomados por este thread, se pueden anidar
+
+
+def getLockPath(path : Path):
+    return path.with_name(path.name + ".lock")
+
+def _heldLocks() -> dict[str, list]:
+    if not hasattr(_local, "held"):
+        _local.held = {} ## lock path -> [fd, exclusivo, profundidad]
+    return _local.held
+
+def _acquire(fd : int, exclusive : bool):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return
+    while True: ## LK_LOCK se rinde a los 10 segundos, seguimos esperando
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+def _release(fd : int):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def fileLock(path : Path, exclusive : bool = False):
+    """
+    Holds a shared (or exclusive) lock on path while the block runs. A thread that already holds the
+    lock can take it again, but a shared lock can't be turned into an exclusive one.
+    """
+    lockPath = str(getLockPath(Path(path)))
+    held = _heldLocks().get(lockPath)
+    if held:
+        if exclusive and not held[1]:
+            raise RuntimeError(f"Can't take an exclusive lock on {path} while holding a shared one")
+        held[2] += 1
+        try:
+            yield
+        finally:
+            held[2] -= 1
+        return
+
+    Path(lockPath).parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lockPath, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        with span("lock wait"):
+            _acquire(fd, exclusive)
+        _heldLocks()[lockPath] = [fd, exclusive, 1]
+        try:
+            yield
+        finally:
+            del _heldLocks()[lockPath]
+            _release(fd)
+    finally:
+        os.close(fd)
+
+def atomicWrite(path : Path, data : bytes):
+    """
+    Replaces path with data in one rename. Readers see the old file or the new one, never a mix.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tempPath = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tempPath, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(tempPath)
+        raise
+    if fcntl: ## que el rename tambien llegue al disco
+        dirFd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dirFd)
+        finally:
+            os.close(dirFd)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 class passwordLog(BaseModel):
     logID : int | None = None
@@ -8,18 +8,93 @@ class passwordLog(BaseModel):
     password : str | None = None
     tags : list[str]| None = None
     createdAt : str| None = None
+    uid : str | None = None ## igual en todas las copias del vault, es lo que compara sync
+    version : int = 1
+    updatedAt : str | None = None
+    _sealedPassword : str | None = PrivateAttr(default=None) ## password todavia encriptado, se abre recien cuando se muestra
     
 
+LOG_FIELDS = ("logID", "service", "user", "email", "password", "tags", "createdAt", "uid", "version", "updatedAt")
+
+class LogRecord:
+    """
+    Lightweight log that vaults load into. passwordLog models are only built at the API edge, with toModel().
+    """
+    __slots__ = LOG_FIELDS + ("_sealedPassword", "_seq")
+    
+    def __init__(self, logID = None, service = None, user = None, email = None, password = None, tags = None, createdAt = None, _sealedPassword = None, uid = None, version = 1, updatedAt = None, _seq = 0):
+        self.logID = logID
+        self.service = service
+        self.user = user
+        self.email = email
+        self.password = password
+        self.tags = tags
+        self.createdAt = createdAt
+        self._sealedPassword = _sealedPassword
+        self.uid = uid
+        self.version = version
+        self.updatedAt = updatedAt
+        self._seq = _seq ## sequence del vault en el ultimo cambio de este log, el cursor de sync
+    
+    @classmethod
+    def fromModel(cls, log : passwordLog):
+        return cls(log.logID, log.service, log.user, log.email, log.password, log.tags, log.createdAt, log._sealedPassword, log.uid, log.version, log.updatedAt)
+    
+    def toModel(self):
+        log = passwordLog.model_construct(**self.asDict()) ## los datos del vault ya estan validados
+        log._sealedPassword = self._sealedPassword
+        return log
+    
+    def copy(self):
+        return LogRecord(self.logID, self.service, self.user, self.email, self.password, self.tags, self.createdAt, self._sealedPassword, self.uid, self.version, self.updatedAt, self._seq)
+    
+    def asDict(self, exclude : tuple[str, ...] = ()):
+        return {field : getattr(self, field) for field in LOG_FIELDS if field not in exclude}
+    
+    def __repr__(self):
+        return f"LogRecord({', '.join(f'{field}={getattr(self, field)!r}' for field in LOG_FIELDS if field != 'password')})"
+
+
+class LogIndexesModel(BaseModel):
+    service : dict[str, list[int]] = {}
+    user : dict[str, list[int]] = {}
+    email : dict[str, list[int]] = {}
+    tags : dict[str, list[int]] = {}
+
 class LogsFileModel(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
     currentLogId : int
-    logs : dict [int, passwordLog]
+    logs : dict [int, LogRecord]
+    indexes : LogIndexesModel | None = None ## derivado de los logs, se arma recien cuando un filtro lo necesita
+    ## sync
+    replicaId : str | None = None ## distinto en cada copia del vault
+    sequence : int = 0 ## sube con cada cambio, los logs y tombstones guardan el valor de su ultimo cambio
+    peers : dict[str, int] = {} ## replicaId -> sequence de esa copia hasta donde ya la vimos
+    tombstones : dict[str, list] = {} ## uid -> [version, updatedAt, seq] de los logs borrados
+    acks : dict[str, int] = {} ## replicaId -> sequence de este vault hasta donde esa copia ya vio
+    _fuzzyIndex : object | None = PrivateAttr(default=None) ## FuzzyIndex, solo en memoria
+    _columns : object | None = PrivateAttr(default=None) ## LogColumns, solo en memoria
+    _savedIndexes : object | None = PrivateAttr(default=None) ## SavedIndexes que vinieron en el archivo
+    _generation : int = PrivateAttr(default=0) ## generation del archivo cuando se leyo o guardo
+    _stamp : tuple | None = PrivateAttr(default=None) ## (generation, tamaño del journal) en disco al leer, para detectar escrituras de otros
+
+class KdfParams(BaseModel):
+    algorithm : str = "pbkdf2-sha256" ## "pbkdf2-sha256" o "scrypt"
+    iterations : int = 600000 ## pbkdf2
+    n : int = 2 ** 15 ## scrypt, costo de cpu y memoria (128 * r * n bytes)
+    r : int = 8
+    p : int = 1
 
 class ProfileModel(BaseModel):
     data_path: str
     encrypted : bool
     salt: str | None = None
     encrypted_dek: str | None = None
+    storage: str = "file" ## "file" reescribe todo el vault, "journal" agrega los cambios a un journal
+    kdf : KdfParams = KdfParams() ## los perfiles viejos no lo tienen, usaban estos mismos valores
 
 class ConfigDataModel(BaseModel):
     active_profile: str
-    profiles: dict[str, ProfileModel]
\ No newline at end of file
+    profiles: dict[str, ProfileModel]
+    session_store: str = "keyring" ## donde vive la sesion activa, se elige al hacer login
\ No newline at end of file
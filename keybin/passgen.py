@@ -0,0 +1,90 @@
+"""
+Secure password generation.
+
+Random bytes are drawn from secrets.token_bytes in batches and mapped to the alphabet with a single
+bytes.translate call. Bytes at or above the largest multiple of the alphabet size are dropped
+(rejection sampling), so every character is equally likely. Passwords that miss a required character
+class are thrown away and drawn again, which keeps the result uniform over the passwords that pass.
+"""
+import math, secrets, string
+
+CHARACTER_CLASSES = {
+    "lower" : string.ascii_lowercase,
+    "upper" : string.ascii_uppercase,
+    "digit" : string.digits,
+    "symbol" : string.punctuation,
+}
+AMBIGUOUS = "Il1O0o|`'\"" ## se confunden al leerlos o copiarlos a mano
+BATCH_SIZE = 256 ## passwords por tanda en iterSecureStrings
+
+
+def getAlphabet(symbols : bool = True, excludeAmbiguous : bool = False):
+    chars = string.ascii_letters + string.digits
+    if symbols : chars += string.punctuation
+    if excludeAmbiguous:
+        chars = "".join(char for char in chars if char not in AMBIGUOUS)
+    return chars
+
+def passwordEntropy(length : int = 16, symbols : bool = True, excludeAmbiguous : bool = False):
+    """
+    Bits of entropy of a generated password, ignoring the small loss from required classes.
+    """
+    return length * math.log2(len(getAlphabet(symbols, excludeAmbiguous)))
+
+def _checkPolicy(length : int, symbols : bool, alphabet : str, require : tuple[str, ...], minEntropy : float | None):
+    if length < 1:
+        raise ValueError("Length must be at least 1")
+    for name in require:
+        if name not in CHARACTER_CLASSES:
+            raise ValueError(f"Unknown character class '{name}', use {', '.join(CHARACTER_CLASSES)}")
+        if name == "symbol" and not symbols:
+            raise ValueError("Can't require symbols without using them")
+    if len(require) > length:
+        raise ValueError(f"A {length} character password can't have {len(require)} required classes")
+    if minEntropy and length * math.log2(len(alphabet)) < minEntropy:
+        needed = math.ceil(minEntropy / math.log2(len(alphabet)))
+        raise ValueError(f"{length} characters give {length * math.log2(len(alphabet)):.0f} bits, use at least {needed} for {minEntropy:g}")
+
+def _randomChars(total : int, alphabet : str):
+    size = len(alphabet)
+    limit = 256 - 256 % size ## los bytes desde aca harian que los primeros caracteres salgan mas seguido
+    table = bytes(ord(alphabet[value % size]) if value < limit else 0 for value in range(256))
+    rejected = bytes(range(limit, 256))
+
+    chunks, drawn = [], 0
+    while drawn < total:
+        missing = total - drawn
+        chunk = secrets.token_bytes(missing * 256 // limit + 16).translate(table, rejected)
+        chunks.append(chunk)
+        drawn += len(chunk)
+    return b"".join(chunks)[:total].decode("ascii")
+
+def newSecureStrings(count : int, length : int = 16, symbols : bool = True, excludeAmbiguous : bool = False, require : tuple[str, ...] = (), minEntropy : float | None = None):
+    """
+    count passwords drawn in one batch. require names character classes every password must have
+    (lower, upper, digit, symbol), minEntropy raises ValueError if length is too short for it.
+    """
+    alphabet = getAlphabet(symbols, excludeAmbiguous)
+    require = tuple(require or ())
+    _checkPolicy(length, symbols, alphabet, require, minEntropy)
+    classes = [frozenset(CHARACTER_CLASSES[name]) & frozenset(alphabet) for name in require]
+
+    passwords : list[str] = []
+    while len(passwords) < count:
+        missing = count - len(passwords)
+        chars = _randomChars(missing * length, alphabet)
+        for start in range(0, len(chars), length):
+            password = chars[start:start + length]
+            if all(not members.isdisjoint(password) for members in classes):
+                passwords.append(password)
+    return passwords
+
+def iterSecureStrings(length : int = 16, symbols : bool = True, excludeAmbiguous : bool = False, require : tuple[str, ...] = (), minEntropy : float | None = None):
+    """
+    Endless passwords, generated BATCH_SIZE at a time. For callers that don't know how many they need, like imports.
+    """
+    while True:
+        yield from newSecureStrings(BATCH_SIZE, length, symbols, excludeAmbiguous, require, minEntropy)
+
+def newSecureString(symbols : bool = True, length : int = 16, excludeAmbiguous : bool = False, require : tuple[str, ...] = (), minEntropy : float | None = None):
+    return newSecureStrings(1, length, symbols, excludeAmbiguous, require, minEntropy)[0]
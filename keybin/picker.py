@@ -0,0 +1,192 @@
+"""
+Interactive picker behind 'keybin log pick'.
+
+Matching works like fzf: a log matches when the query's characters show up in its service, user,
+email or tags in the same order, not necessarily together. With that rule a log that doesn't match a
+query can't match a longer one either, so every keystroke only checks the logs that matched the one
+before, and the sets of previous keystrokes are kept for backspace. Each candidate also keeps where
+its match ended, so checking a new character is one str.find from there, mapped over the candidates
+in C. Taking the earliest match of every character never misses a log that matches.
+
+Results are ranked in three tiers, each in vault order: the query starts a word, the query shows up
+as is, the characters are scattered. Only the rows on screen are ranked.
+"""
+import os, sys
+from contextlib import contextmanager
+from itertools import chain, compress, islice, repeat
+from operator import add
+from keybin.columns import LogColumns
+
+
+def _haystack(service, user, email, tags):
+    ## espacio adelante, asi " query" encuentra tambien al que empieza el primer campo
+    return " " + " ".join(value for value in (service, user, email, *(tags or ())) if value).lower()
+
+def _unique(rows):
+    seen = set()
+    for row in rows:
+        if row not in seen:
+            seen.add(row)
+            yield row
+
+
+class LogMatcher:
+    """
+    Incremental matcher over a vault's columns. push and pop edit the query one character at a time,
+    top returns the IDs of the best matches.
+    """
+
+    def __init__(self, columns : LogColumns):
+        positions = [position for position, logID in enumerate(columns.ids) if logID is not None] ## sin los huecos de los borrados
+        self._ids = [columns.ids[position] for position in positions]
+        haystacks = list(map(_haystack, *([column[position] for position in positions] for column in (columns.service, columns.user, columns.email, columns.tags))))
+        self._states = [(list(range(len(haystacks))), haystacks, [0] * len(haystacks))] ## (filas, haystacks, donde sigue el match) por cada prefijo del query
+        self.query = ""
+
+    def __len__(self):
+        return len(self._states[-1][0])
+
+    @property
+    def total(self):
+        return len(self._ids)
+
+    def push(self, char : str):
+        char = char.lower()
+        self.query += char
+        rows, haystacks, starts = self._states[-1]
+        ## find da -1 si no esta, asi el siguiente inicio (posicion + 1) es 0 justo para los que no matchean
+        nextStarts = list(map(add, map(str.find, haystacks, repeat(char), starts), repeat(1)))
+        self._states.append((list(compress(rows, nextStarts)), list(compress(haystacks, nextStarts)), list(filter(None, nextStarts))))
+
+    def pop(self):
+        if self.query:
+            self.query = self.query[:-1]
+            self._states.pop()
+
+    def clear(self):
+        self.query = ""
+        del self._states[1:]
+
+    def top(self, limit : int):
+        rows, haystacks, _ = self._states[-1]
+        if not self.query:
+            ranked = rows
+        else:
+            tiers = (
+                compress(rows, map(str.__contains__, haystacks, repeat(" " + self.query))),
+                compress(rows, map(str.__contains__, haystacks, repeat(self.query))),
+                rows,
+            )
+            ranked = _unique(chain.from_iterable(tiers))
+        return [self._ids[row] for row in islice(ranked, limit)]
+
+
+@contextmanager
+def _rawTerminal():
+    if os.name == "nt": ## msvcrt ya lee sin eco ni buffer
+        yield
+        return
+    import termios, tty
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd) ## sin eco y de a una tecla, ctrl-c sigue cortando
+        yield
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+def _readKey():
+    """
+    The next key: a character, or "up", "down", "enter", "backspace", "clear" or "escape".
+    """
+    if os.name == "nt":
+        import msvcrt
+        char = msvcrt.getwch()
+        if char in ("\x00", "\xe0"): ## teclas especiales vienen en dos partes
+            return {"H" : "up", "P" : "down"}.get(msvcrt.getwch(), "")
+    else:
+        import select
+        fd = sys.stdin.fileno()
+        data = os.read(fd, 1)
+        if data == b"\x1b":
+            ## una flecha manda ESC [ A de una, un ESC solo no trae nada atras
+            if not select.select([fd], [], [], 0.05)[0]:
+                return "escape"
+            sequence = os.read(fd, 8)
+            return {b"[A" : "up", b"[B" : "down", b"OA" : "up", b"OB" : "down"}.get(sequence, "")
+        while True: ## caracteres de mas de un byte
+            try:
+                char = data.decode("utf-8")
+                break
+            except UnicodeDecodeError:
+                if len(data) >= 4:
+                    return ""
+                data += os.read(fd, 1)
+    return {
+        "\r" : "enter", "\n" : "enter",
+        "\x7f" : "backspace", "\x08" : "backspace",
+        "\x15" : "clear", ## ctrl-u
+        "\x10" : "up", "\x0e" : "down", ## ctrl-p, ctrl-n
+        "\x1b" : "escape",
+    }.get(char, char if char.isprintable() else "")
+
+def _render(matcher : LogMatcher, logs : dict, shown : list[int], selected : int):
+    from rich.console import Group
+    from rich.table import Table
+    from rich.text import Text
+
+    table = Table(box=None, show_header=True, header_style="bold", expand=True)
+    table.add_column("ID", justify="right", style="cyan", no_wrap=True)
+    table.add_column("Service", style="magenta", no_wrap=True)
+    table.add_column("User", style="green", no_wrap=True)
+    table.add_column("Email", style="yellow", no_wrap=True)
+    table.add_column("Tags", style="blue", no_wrap=True)
+    for row, logID in enumerate(shown):
+        log = logs[logID]
+        table.add_row(str(logID), log.service, log.user, log.email, ", ".join(log.tags or ()), style="reverse" if row == selected else None)
+    prompt = Text.assemble(("> ", "bold cyan"), matcher.query)
+    status = Text(f"{len(matcher)}/{matcher.total}  enter copies the password, esc quits", style="dim")
+    return Group(prompt, status, table)
+
+def pickLog(logFile, query : str = ""):
+    """
+    Runs the picker over a loaded vault. Returns the chosen log, or None if the user quit.
+    """
+    from rich.console import Console
+    from rich.live import Live
+    from keybin.columns import getColumns
+
+    console = Console()
+    matcher = LogMatcher(getColumns(logFile))
+    for char in query:
+        matcher.push(char)
+    height = max(5, console.height - 4)
+    selected = 0
+
+    with _rawTerminal(), Live(console=console, auto_refresh=False, transient=True) as live:
+        while True:
+            shown = matcher.top(height)
+            selected = min(selected, max(len(shown) - 1, 0))
+            live.update(_render(matcher, logFile.logs, shown, selected), refresh=True)
+            try:
+                key = _readKey()
+            except KeyboardInterrupt:
+                return None
+            if key == "enter":
+                if shown:
+                    return logFile.logs[shown[selected]]
+            elif key == "escape":
+                return None
+            elif key == "up":
+                selected = max(selected - 1, 0)
+            elif key == "down":
+                selected = min(selected + 1, max(len(shown) - 1, 0))
+            elif key == "backspace":
+                matcher.pop()
+                selected = 0
+            elif key == "clear":
+                matcher.clear()
+                selected = 0
+            elif key:
+                matcher.push(key)
+                selected = 0
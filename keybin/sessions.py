@@ -0,0 +1,122 @@
+"""
+Where the active session (the unwrapped DEK and its timestamp) is kept between commands.
+
+- "keyring": the OS keyring, the default. On Linux servers this goes over D-Bus to the Secret Service.
+- "file": one file per profile in the user's runtime directory (a tmpfs on most Linux hosts), only
+  readable by the user. For headless hosts without a keyring daemon.
+- "memory": only lives in this process, for tests and benchmarks.
+
+core reads the session once per command and writes the refreshed timestamp back once, on exit.
+"""
+import os, hashlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from keybin.timings import span, count
+from keybin.locking import atomicWrite
+
+SESSION_SERVICE = "keybin_session"
+
+
+class SessionStore(ABC):
+    """
+    get returns the session data or None, delete returns False if there was nothing to delete.
+    """
+    name = ""
+
+    @abstractmethod
+    def get(self, user : str) -> str | None:
+        ...
+
+    @abstractmethod
+    def set(self, user : str, sessionData : str):
+        ...
+
+    @abstractmethod
+    def delete(self, user : str) -> bool:
+        ...
+
+
+class KeyringStore(SessionStore):
+    name = "keyring"
+
+    def get(self, user : str):
+        import keyring
+        with span("keyring"):
+            count("keyring_calls")
+            return keyring.get_password(SESSION_SERVICE, f"{user}")
+
+    def set(self, user : str, sessionData : str):
+        import keyring
+        with span("keyring"):
+            count("keyring_calls")
+            keyring.set_password(SESSION_SERVICE, f"{user}", sessionData)
+
+    def delete(self, user : str):
+        import keyring, keyring.errors
+        with span("keyring"):
+            count("keyring_calls")
+            try:
+                keyring.delete_password(SESSION_SERVICE, f"{user}")
+            except keyring.errors.PasswordDeleteError:
+                return False
+        return True
+
+
+class FileStore(SessionStore):
+    name = "file"
+
+    def __init__(self, directory : str | Path | None = None):
+        if directory is None:
+            from platformdirs import user_runtime_dir
+            directory = user_runtime_dir("keybin")
+        self.directory = Path(directory).joinpath("sessions")
+
+    def _path(self, user : str):
+        ## el nombre del perfil no sirve de nombre de archivo tal cual (puede tener / o ..)
+        return self.directory.joinpath(hashlib.sha256(user.encode("utf-8")).hexdigest()[:32])
+
+    def get(self, user : str):
+        with span("session file"):
+            count("session_file_reads")
+            try:
+                fd = os.open(self._path(user), os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+            except FileNotFoundError:
+                return None
+            with open(fd, encoding="utf-8") as file:
+                stat = os.fstat(file.fileno())
+                if hasattr(os, "getuid") and (stat.st_uid != os.getuid() or stat.st_mode & 0o077):
+                    return None ## si otro usuario lo puede leer o escribir no es una sesion nuestra
+                return file.read()
+
+    def set(self, user : str, sessionData : str):
+        with span("session file"):
+            count("session_file_writes")
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            os.chmod(self.directory, 0o700)
+            atomicWrite(self._path(user), sessionData.encode("utf-8")) ## mkstemp ya lo crea con 0600
+
+    def delete(self, user : str):
+        try:
+            os.remove(self._path(user))
+        except FileNotFoundError:
+            return False
+        return True
+
+
+class MemoryStore(SessionStore):
+    name = "memory"
+
+    def __init__(self):
+        self._sessions : dict[str, str] = {}
+
+    def get(self, user : str):
+        return self._sessions.get(user)
+
+    def set(self, user : str, sessionData : str):
+        self._sessions[user] = sessionData
+
+    def delete(self, user : str):
+        return self._sessions.pop(user, None) is not None
+
+
+SESSION_STORES = {store.name : store for store in (KeyringStore, FileStore, MemoryStore)}
@@ -0,0 +1,157 @@
+"""
+Two-way sync between copies of a profile's vault, like the copy on a laptop and one on a USB drive.
+
+Every log has a uid shared by all its copies, a version with its updatedAt, and the vault's sequence
+at its last change. Each vault counts its changes in that sequence and keeps, for every peer, how far
+into the peer's sequence it already merged. Both vaults are still read and decrypted in full, and
+every log's seq is checked against the cursor, but only the logs and tombstones past it are compared
+and copied. Journal profiles then append just those changes.
+
+- The higher (version, updatedAt) wins. Deleting a log leaves a tombstone with the next version, so
+  it beats the log it deleted in every copy.
+- Each vault also keeps, for every peer, how far into its own sequence that peer had saved at the
+  start of their last sync (its acks). Tombstones below the acks of every peer are dropped.
+- A new log whose logID is taken in the other copy gets that copy's next free ID.
+- Both copies are encrypted with the profile's DEK, so passwords travel as sealed tokens and nothing
+  gets decrypted.
+"""
+from pathlib import Path
+from cryptography.fernet import Fernet, InvalidToken
+from keybin.models import LogRecord, LogsFileModel
+from keybin.vaultfile import newUid
+
+
+def _newer(first : tuple, second : tuple):
+    """
+    Whether the (version, updatedAt) pair first wins over second.
+    """
+    return (first[0], first[1] or "") > (second[0], second[1] or "")
+
+def _changesSince(logFile : LogsFileModel, cursor : int):
+    logs = [log for log in logFile.logs.values() if log._seq > cursor]
+    tombstones = {uid : stone for uid, stone in logFile.tombstones.items() if stone[2] > cursor}
+    return logs, tombstones
+
+def mergeChanges(logFile : LogsFileModel, logs : list[LogRecord], tombstones : dict[str, list]):
+    """
+    Applies another copy's changed logs and tombstones to logFile. Returns the entries for commitChanges.
+    """
+    from keybin.core import _addRecord, _dropRecord, _buryRecord, _touch
+    if not logs and not tombstones:
+        return []
+
+    byUid = {log.uid : log for log in logFile.logs.values()}
+    entries = []
+    for log in logs:
+        stone = logFile.tombstones.get(log.uid)
+        if stone and not _newer((log.version, log.updatedAt), stone): ## ya se borro aca
+            continue
+        current = byUid.get(log.uid)
+        if current is not None:
+            if not _newer((log.version, log.updatedAt), (current.version, current.updatedAt)):
+                continue
+            copy = log.copy()
+            copy.logID = current.logID ## cada copia mantiene su ID
+        else:
+            copy = log.copy()
+            if copy.logID <= logFile.currentLogId: ## tomado, o de un log borrado aca
+                copy.logID = logFile.currentLogId + 1
+        _touch(logFile, copy)
+        _addRecord(logFile, copy)
+        byUid[copy.uid] = copy
+        entries.append({"op" : "add", "log" : copy})
+
+    for uid, (version, updatedAt, _) in tombstones.items():
+        current = byUid.get(uid)
+        if current is not None and not _newer((version, updatedAt), (current.version, current.updatedAt)):
+            continue ## el log es mas nuevo que el borrado
+        stone = logFile.tombstones.get(uid)
+        if stone and not _newer((version, updatedAt), stone):
+            continue
+        if current is not None:
+            _dropRecord(logFile, current.logID)
+            del byUid[uid]
+        entries.append(_buryRecord(logFile, current.logID if current else None, uid, version, updatedAt))
+    return entries
+
+def syncVaults(local : LogsFileModel, remote : LogsFileModel):
+    """
+    Merges two copies of a vault into each other, in memory. Returns (localEntries, remoteEntries),
+    the changes each one got, including the new peer cursors and acks.
+    """
+    from keybin.core import _pruneTombstones
+    if remote.replicaId == local.replicaId: ## el archivo se copio a mano, desde ahora son copias distintas
+        remote.replicaId = newUid()
+    ## -1 con un peer que nunca se vio, asi tambien van los logs de antes de sync, que tienen seq 0
+    localSeen, remoteSeen = remote.peers.get(local.replicaId, -1), local.peers.get(remote.replicaId, -1)
+    toRemote = _changesSince(local, localSeen)
+    toLocal = _changesSince(remote, remoteSeen)
+    localEntries = mergeChanges(local, *toLocal)
+    remoteEntries = mergeChanges(remote, *toRemote)
+
+    ## lo que cada uno acaba de recibir del otro tambien queda visto, no vuelve en el proximo sync
+    for logFile, entries, peer in ((local, localEntries, remote), (remote, remoteEntries, local)):
+        if logFile.peers.get(peer.replicaId) != peer.sequence:
+            logFile.peers[peer.replicaId] = peer.sequence
+            entries.append({"op" : "peer", "replicaId" : peer.replicaId, "seq" : peer.sequence})
+    
+    ## los acks salen de lo que el otro ya tenia guardado, no de este sync: si se corta entre las dos
+    ## escrituras, ninguno descarta un tombstone que el otro no llego a guardar
+    for logFile, entries, peer, seen in ((local, localEntries, remote, localSeen), (remote, remoteEntries, local, remoteSeen)):
+        if logFile.acks.get(peer.replicaId, 0) < seen:
+            logFile.acks[peer.replicaId] = seen
+            entries.append({"op" : "ack", "replicaId" : peer.replicaId, "seq" : seen})
+            _pruneTombstones(logFile)
+    return localEntries, remoteEntries
+
+def countChanges(entries : list[dict]):
+    """
+    (added, deleted) logs in a list of entries.
+    """
+    added = sum(1 for entry in entries if entry["op"] == "add")
+    deleted = sum(1 for entry in entries if entry["op"] == "delete" and entry["logID"] is not None)
+    return added, deleted
+
+def syncWith(otherPath : str | Path, dryRun : bool = False):
+    """
+    Syncs the active profile's vault with the copy at otherPath, which has to be a copy of the same
+    profile. Both are locked while it runs. Returns ((added, deleted) here, (added, deleted) there).
+    A dry run doesn't write either file, not even to migrate one in an older format.
+    """
+    from keybin.core import getConfig, getUserProfile, getActivePath, getSessionDek, getJournalPath, readLogFile, emptyLogFile, createLogFile, commitChanges, writeLogFile
+    from keybin.locking import fileLock
+    from keybin.exceptions import KeybinError
+
+    userProfile = getUserProfile(getConfig().active_profile)
+    f = Fernet(getSessionDek()) if userProfile.encrypted else None
+    path = getActivePath()
+    otherPath = Path(otherPath).expanduser().resolve()
+    if otherPath == path.resolve():
+        raise KeybinError("ERROR: That's the active profile's own vault.")
+    if not otherPath.is_file():
+        raise KeybinError(f"ERROR: No vault at {otherPath}.")
+    if not path.exists() and not dryRun:
+        createLogFile(path)
+    ## la otra copia usa journal si lo tiene al lado, sino se lee y escribe entera
+    otherProfile = userProfile.model_copy(update={"data_path" : str(otherPath), "storage" : "journal" if getJournalPath(otherPath).exists() else "file"})
+
+    ## siempre en el mismo orden, asi dos syncs cruzados no se bloquean entre si
+    first, second = sorted((path, otherPath), key=lambda lockPath: str(lockPath.resolve()))
+    with fileLock(first, exclusive=True), fileLock(second, exclusive=True):
+        local = readLogFile(path, userProfile, f, migrate=not dryRun) if path.exists() else emptyLogFile()
+        try:
+            remote = readLogFile(otherPath, otherProfile, f, migrate=not dryRun)
+        except (InvalidToken, ValueError, KeyError) as e: ## otro dek, un vault sin encriptar o un archivo que no es un vault
+            raise KeybinError(f"ERROR: {otherPath} isn't a copy of this profile's vault. {e}".strip())
+        replicaIds = (local.replicaId, remote.replicaId)
+        for logFile in (local, remote):
+            if logFile.replicaId is None : logFile.replicaId = newUid() ## vault de antes de sync
+        localEntries, remoteEntries = syncVaults(local, remote)
+
+        if not dryRun:
+            for target, targetProfile, logFile, entries, replicaId in ((path, userProfile, local, localEntries, replicaIds[0]), (otherPath, otherProfile, remote, remoteEntries, replicaIds[1])):
+                if logFile.replicaId != replicaId: ## el replicaId no va al journal, solo al snapshot
+                    writeLogFile(target, logFile, f)
+                elif entries:
+                    commitChanges(target, targetProfile, f, logFile, entries)
+    return countChanges(localEntries), countChanges(remoteEntries)
@@ -0,0 +1,128 @@
+"""
+Per-phase timings for keybin commands.
+
+Code marks its phases with `span("name")` and counts things with `count("name")`. Nothing is recorded
+until `enable()` is called (`keybin --timings` does it) or a hook is added, so the marks cost almost
+nothing on normal runs. Hooks get every span and counter as a dict:
+
+    {"event" : "span", "name" : "kdf", "start" : 0.0123, "duration" : 0.48, "depth" : 1}
+    {"event" : "count", "name" : "kdf_runs", "value" : 1, "total" : 1}
+
+`start` is in seconds since recording started.
+"""
+import time
+
+_enabled = False
+_origin = 0.0 ## perf_counter de cuando se empezo a grabar
+_depth = 0
+_spans : list[dict] = []
+_counters : dict[str, int] = {}
+_hooks : list = []
+
+
+def enable():
+    """
+    Starts recording spans and counters, clearing anything recorded before.
+    """
+    global _enabled
+    reset()
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = bool(_hooks) ## con hooks se sigue grabando
+
+def isEnabled():
+    return _enabled
+
+def reset():
+    global _origin, _depth
+    _origin = time.perf_counter()
+    _depth = 0
+    _spans.clear()
+    _counters.clear()
+
+def addHook(hook):
+    """
+    Calls hook(event) for every span and counter from now on. Adding a hook turns recording on.
+    """
+    global _enabled
+    if not _enabled : reset()
+    _hooks.append(hook)
+    _enabled = True
+
+def removeHook(hook):
+    global _enabled
+    _hooks.remove(hook)
+    if not _hooks : _enabled = False
+
+def _emit(event : dict):
+    for hook in list(_hooks):
+        hook(event)
+
+
+class span:
+    """
+    Context manager that times a phase. Spans can be nested.
+    """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name : str):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        global _depth
+        if _enabled:
+            self.start = time.perf_counter()
+            _depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        global _depth
+        if self.start is None: ## se activo en el medio del span, no hay inicio
+            return False
+        duration = time.perf_counter() - self.start
+        _depth -= 1
+        event = {"event" : "span", "name" : self.name, "start" : self.start - _origin, "duration" : duration, "depth" : _depth}
+        _spans.append(event)
+        if _hooks : _emit(event)
+        return False
+
+def count(name : str, value : int = 1):
+    if not _enabled:
+        return
+    total = _counters.get(name, 0) + value
+    _counters[name] = total
+    if _hooks : _emit({"event" : "count", "name" : name, "value" : value, "total" : total})
+
+
+def report():
+    """
+    Recorded spans grouped by phase (in the order they first started) and the counters.
+    """
+    phases : dict[tuple[int, str], dict] = {}
+    for event in sorted(_spans, key=lambda event: event["start"]):
+        phase = phases.setdefault((event["depth"], event["name"]), {"name" : event["name"], "depth" : event["depth"], "calls" : 0, "total" : 0.0})
+        phase["calls"] += 1
+        phase["total"] += event["duration"]
+    return {
+        "wall" : time.perf_counter() - _origin,
+        "phases" : list(phases.values()),
+        "counters" : dict(_counters),
+    }
+
+def formatReport():
+    data = report()
+    wall = data["wall"]
+    lines = [f"--- timings: {wall * 1000:.1f} ms total ---"]
+    for phase in data["phases"]:
+        label = "  " * phase["depth"] + phase["name"]
+        calls = f" x{phase['calls']}" if phase["calls"] > 1 else ""
+        share = phase["total"] / wall * 100 if wall else 0
+        lines.append(f"{label + calls:<32} {phase['total'] * 1000:9.1f} ms {share:5.1f}%")
+    untimed = wall - sum(phase["total"] for phase in data["phases"] if phase["depth"] == 0)
+    lines.append(f"{'(imports, other)':<32} {untimed * 1000:9.1f} ms {untimed / wall * 100 if wall else 0:5.1f}%") ## lo que no cae en ningun span
+    for name, value in data["counters"].items():
+        lines.append(f"{name:<32} {value:>9}")
+    return "\n".join(lines)
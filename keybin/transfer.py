@@ -0,0 +1,179 @@
+import base64, csv, io, json, os
+from hashlib import pbkdf2_hmac
+from typing import Iterable, Iterator
+from cryptography.fernet import Fernet, InvalidToken
+from pydantic import ValidationError
+from keybin.exceptions import InvalidPasswordError
+from keybin.models import passwordLog
+
+IMPORT_FORMATS = ("auto", "csv", "jsonl", "bitwarden", "lastpass", "chrome", "1password")
+EXPORT_FORMATS = ("jsonl", "csv")
+EXPORT_FIELDS = ("logID", "service", "user", "email", "password", "tags", "createdAt")
+ARCHIVE_FORMAT = "keybin-archive"
+ARCHIVE_ITERATIONS = 600000
+
+## columnas de cada export -> campo de keybin. "login" es user o email segun tenga @
+CSV_LAYOUTS = {
+    "csv" : {"service" : "service", "user" : "user", "email" : "email", "password" : "password", "tags" : "tags"},
+    "bitwarden" : {"name" : "service", "login_username" : "login", "login_password" : "password", "folder" : "tags"},
+    "lastpass" : {"name" : "service", "username" : "login", "password" : "password", "grouping" : "tags"},
+    "chrome" : {"name" : "service", "username" : "login", "password" : "password"},
+    "1password" : {"title" : "service", "username" : "login", "password" : "password", "tags" : "tags"},
+}
+## columnas que delatan cada layout, en orden de prioridad para "auto"
+CSV_SIGNATURES = (
+    ("bitwarden", {"login_username", "login_password"}),
+    ("lastpass", {"grouping", "extra"}),
+    ("1password", {"title", "username", "password"}),
+    ("chrome", {"name", "url", "username", "password"}),
+    ("csv", {"service"}),
+)
+
+
+def detectCsvLayout(header : list[str]):
+    columns = {column.strip().lower() for column in header}
+    for layout, signature in CSV_SIGNATURES:
+        if signature <= columns:
+            return layout
+    return None
+
+def _splitTags(value):
+    if isinstance(value, list):
+        return [str(tag).strip() for tag in value if str(tag).strip()] or None
+    tags = [tag.strip() for tag in str(value).split(",") if tag.strip()]
+    return tags or None
+
+def _toLog(fields : dict):
+    """
+    Validates one imported row. The ID and creation date are set when the row is added to the vault.
+    """
+    login = fields.pop("login", None)
+    if login:
+        fields.setdefault("email" if "@" in login else "user", login)
+    fields = {field : value for field, value in fields.items() if value not in (None, "")}
+    if "tags" in fields:
+        fields["tags"] = _splitTags(fields["tags"])
+    if not any(fields.get(field) for field in ("service", "user", "email")):
+        raise ValueError("needs at least a service, user or email")
+    return passwordLog.model_validate(fields)
+
+def iterImport(stream : Iterable[str], format : str = "auto") -> Iterator[tuple[int, passwordLog | None, str | None]]:
+    """
+    Parses an import file row by row without loading it whole. Yields (row number, log, None) for
+    valid rows and (row number, None, error) for the rest.
+    """
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format '{format}'")
+    
+    if format == "auto":
+        lines = iter(stream)
+        first = next(lines, "")
+        if not first: ## archivo vacio, como el export jsonl de una busqueda sin resultados
+            return
+        format = "jsonl" if first.lstrip().startswith("{") else None
+        stream = _prepend(first, lines)
+    
+    if format == "jsonl":
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object")
+                yield number, _toLog({field : row.get(field) for field in ("service", "user", "email", "password", "tags")}), None
+            except (ValueError, ValidationError) as e:
+                yield number, None, _errorMessage(e)
+        return
+    
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    if format is None:
+        format = detectCsvLayout(header)
+        if format is None:
+            raise ValueError("Couldn't detect the CSV layout, pass the format explicitly")
+    
+    layout = CSV_LAYOUTS[format]
+    columns = [layout.get(column.strip().lower()) for column in header]
+    for number, row in enumerate(reader, start=2): ## la fila 1 es el header
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            yield number, _toLog({field : value for field, value in zip(columns, row) if field}), None
+        except (ValueError, ValidationError) as e:
+            yield number, None, _errorMessage(e)
+
+def _prepend(line : str, stream : Iterable[str]):
+    yield line
+    yield from stream
+
+def _errorMessage(error : Exception):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, issue['loc']))}: {issue['msg']}" for issue in error.errors())
+    return str(error)
+
+
+def iterExportLines(logs : Iterable[passwordLog], format : str = "jsonl") -> Iterator[str]:
+    """
+    Turns logs into export lines one at a time, CSV starts with its header.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{format}'")
+    
+    if format == "jsonl":
+        for log in logs:
+            yield json.dumps(log.model_dump(include=set(EXPORT_FIELDS))) + "\n"
+        return
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue() ## cada linea sale sola, el archive encripta de a una y un export vacio igual tiene header
+    buffer.seek(0)
+    buffer.truncate()
+    for log in logs:
+        row = log.model_dump(include=set(EXPORT_FIELDS))
+        row["tags"] = ",".join(row["tags"] or [])
+        writer.writerow(["" if row[field] is None else row[field] for field in EXPORT_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def _archiveFernet(passphrase : str, salt : bytes, iterations : int):
+    kek = pbkdf2_hmac("sha256", passphrase.encode("utf-8"), salt, iterations)
+    return Fernet(base64.urlsafe_b64encode(kek))
+
+def iterArchiveLines(lines : Iterable[str], passphrase : str) -> Iterator[str]:
+    """
+    Wraps export lines in a passphrase protected archive: a JSON header with the KDF parameters,
+    then every line encrypted on its own so it can be written and read as a stream.
+    """
+    salt = os.urandom(16)
+    header = {"format" : ARCHIVE_FORMAT, "version" : 1, "kdf" : "pbkdf2-sha256", "iterations" : ARCHIVE_ITERATIONS, "salt" : base64.b64encode(salt).decode("utf-8")}
+    yield json.dumps(header) + "\n"
+    f = _archiveFernet(passphrase, salt, ARCHIVE_ITERATIONS)
+    for line in lines:
+        yield f.encrypt(line.encode("utf-8")).decode("utf-8") + "\n"
+
+def isArchiveHeader(line : str):
+    try:
+        return json.loads(line).get("format") == ARCHIVE_FORMAT
+    except (ValueError, AttributeError):
+        return False
+
+def iterArchiveContent(lines : Iterable[str], passphrase : str) -> Iterator[str]:
+    """
+    Reads back an archive written by iterArchiveLines, yielding the original export lines.
+    """
+    lines = iter(lines)
+    header = json.loads(next(lines))
+    f = _archiveFernet(passphrase, base64.b64decode(header["salt"]), header["iterations"])
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield f.decrypt(line.strip().encode("utf-8")).decode("utf-8")
+        except InvalidToken:
+            raise InvalidPasswordError("ERROR: Wrong passphrase or damaged archive")
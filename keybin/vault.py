@@ -0,0 +1,134 @@
+from pathlib import Path
+from cryptography.fernet import Fernet
+from keybin.core import getConfig, getSessionDek, unlockDek, readLogFile, emptyLogFile, commitChanges, insertLog, removeLog, searchLogFile, revealLog
+from keybin.exceptions import *
+from keybin.models import LogRecord, LogsFileModel
+
+
+class Vault:
+    """
+    A profile's vault kept in memory, for using keybin from Python.
+
+    Changes stay in memory until flush(), which saves them all with one write. As a context manager
+    it flushes when the block ends, and drops the pending changes if the block raised:
+
+        with Vault() as vault:
+            for row in rows:
+                vault.add(service=row.service, password=row.password)
+
+    Without a profile it opens the active session's profile. Other profiles need their masterkey.
+    """
+    
+    def __init__(self, profile : str | None = None, key : str | None = None):
+        config = getConfig()
+        self.profile = profile or config.active_profile
+        if not self.profile:
+            raise NoSessionActiveError("ERROR: No active session, log in or pass a profile.")
+        if self.profile not in config.profiles:
+            raise UserNotFoundError("ERROR: Profile does not exist")
+        
+        self._profileData = config.profiles[self.profile]
+        self._path = Path(self._profileData.data_path)
+        self._fernet : Fernet | None = None
+        self._sessionKey = False ## usa el dek de la sesion, deja de andar cuando vence
+        if self._profileData.encrypted:
+            if key:
+                self._fernet = Fernet(unlockDek(key, self.profile))
+            elif self.profile == config.active_profile:
+                self._fernet = Fernet(getSessionDek())
+                self._sessionKey = True
+            else:
+                raise PasswordNeededError("ERROR: Masterkey required for this profile")
+        
+        self._logFile : LogsFileModel | None = None
+        self._changes : list[dict] = [] ## lo que se cambio desde el ultimo flush, por si hay que aplicarlo sobre cambios de otros
+        self._dirty = False
+    
+    def open(self):
+        if self._logFile is None:
+            if self._path.exists():
+                self._logFile = readLogFile(self._path, self._profileData, self._fernet)
+            else:
+                self._logFile = emptyLogFile()
+                self._dirty = True
+        return self
+    
+    def __enter__(self):
+        return self.open()
+    
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+        return False
+    
+    def __len__(self):
+        return len(self._vault().logs)
+    
+    def _vault(self):
+        self._checkSession()
+        return self.open()._logFile
+    
+    def _checkSession(self):
+        if self._sessionKey:
+            getSessionDek() ## SessionExpiredError si la sesion vencio mientras el vault estaba abierto
+    
+    def _revealed(self, log : LogRecord):
+        ## modelo nuevo, asi los logs que quedan en memoria siguen con el password sellado
+        return revealLog(log.toModel(), self._fernet) if self._fernet else log.toModel()
+    
+    def get(self, id : int):
+        log = self._vault().logs.get(id)
+        if log is None:
+            raise NoLogFoundError("ERROR: No log with this ID.")
+        return self._revealed(log)
+    
+    def find(self, search : str | None = None, service : str | None = None, user : str | None = None, email : str | None = None, tags : list[str] | None = None, id : int | None = None, limit : int | None = None):
+        """
+        Same filters as 'keybin log find'. Returns copies of the matching logs with their passwords.
+        """
+        return list(self.iterFind(search, service, user, email, tags, id, limit))
+    
+    def iterFind(self, search : str | None = None, service : str | None = None, user : str | None = None, email : str | None = None, tags : list[str] | None = None, id : int | None = None, limit : int | None = None):
+        """
+        Like find, but reveals one log at a time as the caller consumes them.
+        """
+        if not any((search, service, user, email, tags, id)):
+            search = "all"
+        try:
+            logs = searchLogFile(self._vault(), search, service, user, email, tags, id, limit)
+        except NoLogFoundError:
+            return
+        for log in logs:
+            yield self._revealed(log)
+    
+    def add(self, service : str | None = None, user : str | None = None, email : str | None = None, password : str | None = None, tags : list[str] | None = None):
+        log = insertLog(self._vault(), service, user, email, password, tags, save=False)
+        self._changes.append({"op" : "add", "log" : log})
+        self._dirty = True
+        return log.logID
+    
+    def delete(self, id : int):
+        self._changes.append(removeLog(self._vault(), id, save=False))
+        self._dirty = True
+    
+    def flush(self):
+        """
+        Saves every pending change with a single write of the vault. If another process saved the
+        vault since it was opened, the changes are applied on top of its version and new logs can
+        end up with different IDs.
+        """
+        if self._dirty:
+            self._checkSession()
+            commitChanges(self._path, self._profileData, self._fernet, self._logFile, self._changes)
+            self._changes = []
+            self._dirty = False
+    
+    def discard(self):
+        """
+        Drops the pending changes, the next call reloads the vault from disk.
+        """
+        self._logFile = None
+        self._changes = []
+        self._dirty = False
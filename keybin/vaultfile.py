@@ -0,0 +1,170 @@
+"""
+On-disk format of the vaults.
+
+    b"KBV" | version (1 byte) | flags (1 byte) | generation (8 bytes) | sections
+
+The generation goes up by one on every write, so writers can tell whether someone else saved the
+vault after they read it.
+
+Every section is a 4 byte big-endian length followed by its data:
+
+1. The logs as zlib-compressed JSON columns, one list per field aligned by position, plus the
+   currentLogId and the sync state (replica ID, sequence, peers, tombstones and acks). Encrypted vaults
+   encrypt this section with the DEK.
+2. Encrypted vaults only: the password column, one Fernet token (or null) per log. Passwords are
+   sealed on their own so they are only decrypted when shown.
+3. The exact indexes (service, user, email and tags to log IDs), split in hash buckets that are
+   compressed, and encrypted, one by one. See keybin.indexes.SavedIndexes. Vaults saved before it
+   existed don't have it, they get it on their next save.
+
+Vaults saved before this format (indented JSON, the JSON envelope and the single Fernet token) are
+still read with decodeLegacy, and are rewritten in this format the first time they are loaded.
+Logs from before version 4 get a uid derived from their content, so every copy of an old vault
+agrees on it.
+"""
+import gc, json, struct, zlib, uuid
+from hashlib import sha256
+from contextlib import contextmanager
+from itertools import repeat
+from cryptography.fernet import Fernet
+from keybin.models import LogRecord, LogsFileModel
+from keybin.columns import LogColumns
+from keybin.indexes import SavedIndexes, encodeSavedIndexes
+from keybin.timings import span, count
+
+VAULT_MAGIC = b"KBV"
+VAULT_VERSION = 4
+FLAG_ENCRYPTED = 1
+COMPRESSION_LEVEL = 1 ## los nombres y mails se repiten mucho, el nivel 1 ya comprime casi igual y es varias veces mas rapido
+COLUMNS = ("logID", "service", "user", "email", "tags", "createdAt")
+SYNC_COLUMNS = ("uid", "version", "updatedAt")
+
+_SECTION_LENGTH = struct.Struct(">I")
+_GENERATION = struct.Struct(">Q")
+HEADER_SIZE = len(VAULT_MAGIC) + 2 + _GENERATION.size
+
+
+def isVaultFile(data : bytes):
+    return data[:len(VAULT_MAGIC)] == VAULT_MAGIC
+
+def readGeneration(header : bytes):
+    """
+    The generation in a vault's first HEADER_SIZE bytes, 0 for vaults from before the generation existed.
+    """
+    if not isVaultFile(header) or header[3] < 3:
+        return 0
+    return _GENERATION.unpack_from(header, 5)[0]
+
+def newUid():
+    return uuid.uuid4().hex
+
+def legacyUid(logID, service, user, email, createdAt):
+    return sha256(json.dumps([logID, service, user, email, createdAt]).encode("utf-8")).hexdigest()[:32]
+
+def decryptBytes(f : Fernet, token : bytes):
+    with span("decrypt"):
+        data = f.decrypt(token)
+    count("bytes_decrypted", len(data))
+    return data
+
+@contextmanager
+def _bulkLoad():
+    ## mientras se crean cientos de miles de objetos el gc no tiene nada para juntar, solo agrega pasadas
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled : gc.enable()
+
+def encodeVault(logFile : LogsFileModel, f : Fernet | None, sealPassword, generation : int = 0):
+    """
+    Serializes the vault. sealPassword(log) returns the log's password token, only used when f is given.
+    """
+    logs = logFile.logs.values()
+    columns = {field : [getattr(log, field) for log in logs] for field in COLUMNS}
+    columns.update({field : [getattr(log, field) for log in logs] for field in SYNC_COLUMNS})
+    columns["seq"] = [log._seq for log in logs]
+    columns["currentLogId"] = logFile.currentLogId
+    columns["sync"] = {"replicaId" : logFile.replicaId, "sequence" : logFile.sequence, "peers" : logFile.peers, "tombstones" : logFile.tombstones, "acks" : logFile.acks}
+    if not f:
+        columns["password"] = [log.password for log in logs]
+
+    body = zlib.compress(json.dumps(columns, separators=(",", ":")).encode("utf-8"), COMPRESSION_LEVEL)
+    sections = [f.encrypt(body) if f else body]
+    if f:
+        sections.append(json.dumps([sealPassword(log) for log in logs], separators=(",", ":")).encode("utf-8"))
+    with span("encode indexes"), _bulkLoad():
+        indexes = encodeSavedIndexes(columns, logFile.logs, f, logFile._savedIndexes)
+    sections.append(indexes)
+    logFile._savedIndexes = SavedIndexes(indexes, f) ## ya coinciden con lo que se guarda
+
+    header = VAULT_MAGIC + bytes((VAULT_VERSION, FLAG_ENCRYPTED if f else 0)) + _GENERATION.pack(generation)
+    return b"".join([header] + [_SECTION_LENGTH.pack(len(section)) + section for section in sections])
+
+def decodeVault(data : bytes, f : Fernet | None):
+    version, flags = data[3], data[4]
+    if version not in (2, 3, VAULT_VERSION): ## la 2 no tiene generation, la 3 no tiene los datos de sync
+        raise ValueError(f"Unsupported vault version {version}")
+    if bool(flags & FLAG_ENCRYPTED) != bool(f):
+        raise ValueError("Vault encryption doesn't match the profile")
+
+    sections = []
+    offset = HEADER_SIZE if version >= 3 else 5
+    while offset < len(data):
+        (length,) = _SECTION_LENGTH.unpack_from(data, offset)
+        offset += _SECTION_LENGTH.size
+        sections.append(data[offset:offset + length])
+        offset += length
+
+    body = decryptBytes(f, sections[0]) if f else sections[0]
+    with span("decode"), _bulkLoad():
+        columns = json.loads(zlib.decompress(body))
+        if f:
+            passwords = repeat(None)
+            sealed = json.loads(sections[1])
+        else:
+            passwords = columns["password"]
+            sealed = repeat(None)
+        ids = columns["logID"]
+        if version < 4:
+            columns["uid"] = list(map(legacyUid, ids, columns["service"], columns["user"], columns["email"], columns["createdAt"]))
+            columns["version"], columns["updatedAt"], columns["seq"] = repeat(1), columns["createdAt"], repeat(0)
+        records = map(LogRecord, ids, columns["service"], columns["user"], columns["email"], passwords, columns["tags"], columns["createdAt"], sealed,
+                      columns["uid"], columns["version"], columns["updatedAt"], columns["seq"])
+        logFile = _logFile(columns["currentLogId"], dict(zip(ids, records)), columns.get("sync"))
+        logFile._generation = readGeneration(data[:HEADER_SIZE])
+        ## las columnas ya vienen armadas en el archivo, las busquedas las usan tal cual
+        logFile._columns = LogColumns(ids, columns["service"], columns["user"], columns["email"], columns["tags"], columns["createdAt"])
+    indexSection = 2 if f else 1
+    if len(sections) > indexSection:
+        logFile._savedIndexes = SavedIndexes(sections[indexSection], f)
+    return logFile
+
+def decodeLegacy(data : bytes, f : Fernet | None):
+    """
+    Reads the JSON formats from before VAULT_VERSION 2.
+    """
+    sealed = {}
+    if f:
+        if not data.startswith(b"{"): ## todo el vault en un solo token
+            data = decryptBytes(f, data)
+        else: ## envelope, el indice encriptado y los passwords sellados aparte
+            envelope = json.loads(data)
+            data = decryptBytes(f, envelope["index"].encode("utf-8"))
+            sealed = {int(logID) : token for logID, token in envelope["passwords"].items()}
+
+    with span("decode"), _bulkLoad():
+        stored = json.loads(data)
+        logs = {}
+        for logID, log in stored["logs"].items():
+            record = LogRecord(**log)
+            record._sealedPassword = sealed.get(int(logID))
+            record.uid = legacyUid(record.logID, record.service, record.user, record.email, record.createdAt)
+            record.updatedAt = record.createdAt
+            logs[int(logID)] = record
+        return _logFile(stored["currentLogId"], logs) ## los indices viejos se descartan, se rearman si hacen falta
+
+def _logFile(currentLogId : int, logs : dict[int, LogRecord], sync : dict | None = None):
+    sync = sync or {"replicaId" : None, "sequence" : 0, "peers" : {}, "tombstones" : {}, "acks" : {}}
+    return LogsFileModel.model_construct(currentLogId=currentLogId, logs=logs, indexes=None, **sync) ## sin validar, los logs ya son LogRecord
@@ -0,0 +1,43 @@
+import pytest
+from cryptography.fernet import Fernet
+from keybin import core
+from keybin.bench import isolatedKeybin
+from keybin.models import KdfParams
+
+FAST_KDF = KdfParams(iterations=1000) ## los tests no prueban el kdf, con el default cada login tarda medio segundo
+
+
+@pytest.fixture
+def home():
+    """
+    A temporary keybin home: config, vaults and an in-memory session store, agent disabled.
+    """
+    with isolatedKeybin() as tmp:
+        yield tmp
+
+@pytest.fixture
+def profile(home):
+    """
+    Creates a profile and logs into it. Returns its vault path.
+    """
+    def create(name : str = "test", key : str | None = None, storage : str = "file"):
+        core.startProfile(name, key, storage=storage, kdf=FAST_KDF)
+        if core.getConfig().active_profile:
+            core.eraseToken()
+        core.createToken(name, key)
+        return core.getActivePath()
+    return create
+
+def sessionFernet():
+    """
+    The active profile's DEK, None when it has no masterkey.
+    """
+    userProfile = core.getUserProfile(core.getConfig().active_profile)
+    return Fernet(core.getSessionDek()) if userProfile.encrypted else None
+
+def readCopy(path):
+    """
+    Loads another copy of the active profile's vault.
+    """
+    userProfile = core.getUserProfile(core.getConfig().active_profile).model_copy(update={"data_path" : str(path)})
+    return core.readLogFile(path, userProfile, sessionFernet())
@@ -0,0 +1,33 @@
+import multiprocessing
+import pytest
+from keybin import core
+from keybin.vault import Vault
+
+WORKERS = 6
+LOGS = 20
+
+## los procesos heredan el config temporal y la sesion en memoria del test
+pytestmark = pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+
+
+def _addLogs(worker : int, batched : bool):
+    if batched:
+        for start in range(0, LOGS, 5):
+            with Vault() as vault:
+                for number in range(start, start + 5):
+                    vault.add(service=f"worker{worker}", user=f"user{number}", password="pw")
+    else:
+        for number in range(LOGS):
+            core.newLog(f"worker{worker}", f"user{number}", None, "pw", None)
+
+@pytest.mark.parametrize("storage", ["file", "journal"])
+@pytest.mark.parametrize("batched", [False, True])
+def test_concurrent_writers_keep_every_log(profile, storage, batched):
+    profile(key="masterkey", storage=storage)
+    with multiprocessing.get_context("fork").Pool(WORKERS) as pool:
+        pool.starmap(_addLogs, [(worker, batched) for worker in range(WORKERS)])
+
+    logs = core.getLogFile().logs
+    assert {(log.service, log.user) for log in logs.values()} == {(f"worker{worker}", f"user{number}") for worker in range(WORKERS) for number in range(LOGS)}
+    assert sorted(logs) == list(range(1, WORKERS * LOGS + 1))
+    assert len({log.uid for log in logs.values()}) == WORKERS * LOGS
@@ -0,0 +1,32 @@
+from keybin import core
+
+
+def test_torn_append_is_ignored_and_dropped(profile):
+    path = profile(key="masterkey", storage="journal")
+    for service in ("GitHub", "Gitlab", "Google", "Gmail"):
+        core.newLog(service, "jota", None, "pw", None)
+    journal = core.getJournalPath(path)
+    data = journal.read_bytes()
+    lastLine = data.rstrip(b"\n").rfind(b"\n") + 1
+    journal.write_bytes(data[:lastLine + (len(data) - lastLine) // 2]) ## el ultimo append se corto a la mitad
+
+    logs = core.getLogFile().logs
+    assert [log.service for log in logs.values()] == ["GitHub", "Gitlab", "Google"]
+
+    core.newLog("Gmail", "jota", None, "pw", None)
+    assert journal.read_bytes().endswith(b"\n")
+    logs = core.getLogFile().logs
+    assert [(log.logID, log.service) for log in logs.values()] == [(1, "GitHub"), (2, "Gitlab"), (3, "Google"), (4, "Gmail")]
+
+def test_replay_matches_compacted_vault(profile):
+    profile(storage="journal")
+    for service in ("GitHub", "Gitlab", "Google"):
+        core.newLog(service, "jota", None, "pw", None)
+    core.deleteLog(2, True)
+    replayed = core.getLogFile()
+
+    assert core.compactJournal()
+    compacted = core.getLogFile()
+    assert [log.asDict() for log in compacted.logs.values()] == [log.asDict() for log in replayed.logs.values()]
+    assert compacted.tombstones == replayed.tombstones
+    assert not core.getJournalPath(core.getActivePath()).exists()
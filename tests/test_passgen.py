@@ -0,0 +1,58 @@
+import string
+import pytest
+from typer.testing import CliRunner
+from keybin import passgen
+from keybin.cli import app
+from keybin.passgen import AMBIGUOUS, CHARACTER_CLASSES, getAlphabet, newSecureStrings
+
+
+@pytest.mark.parametrize("symbols", [True, False])
+@pytest.mark.parametrize("excludeAmbiguous", [True, False])
+def test_length_and_alphabet(symbols, excludeAmbiguous):
+    alphabet = set(getAlphabet(symbols, excludeAmbiguous))
+    passwords = newSecureStrings(200, 24, symbols, excludeAmbiguous)
+    assert len(passwords) == 200
+    assert all(len(password) == 24 for password in passwords)
+    assert set("".join(passwords)) <= alphabet
+    assert (set(string.punctuation) & alphabet != set()) == symbols
+    assert (set(AMBIGUOUS) & alphabet == set()) == excludeAmbiguous
+
+def test_every_character_shows_up():
+    ## 200k caracteres sobre 94, con un sesgo grosero alguno faltaria o se iria lejos del promedio
+    chars = "".join(newSecureStrings(2000, 100))
+    counts = {char : chars.count(char) for char in getAlphabet()}
+    expected = len(chars) / len(counts)
+    assert all(0.8 * expected < count < 1.2 * expected for count in counts.values())
+
+def test_required_classes_are_present():
+    ## con 4 caracteres casi la mitad de los passwords no tiene las 4 clases, el loop tiene que descartarlos
+    passwords = newSecureStrings(500, 4, require=tuple(CHARACTER_CLASSES))
+    for password in passwords:
+        for members in CHARACTER_CLASSES.values():
+            assert set(password) & set(members)
+    passwords = newSecureStrings(200, 6, symbols=False, excludeAmbiguous=True, require=("digit", "upper"))
+    assert all(set(password) & set(string.digits) and set(password) & set(string.ascii_uppercase) for password in passwords)
+
+def test_policy_errors():
+    with pytest.raises(ValueError, match="required classes"):
+        newSecureStrings(1, 3, require=tuple(CHARACTER_CLASSES))
+    with pytest.raises(ValueError, match="without using them"):
+        newSecureStrings(1, 16, symbols=False, require=("symbol",))
+    with pytest.raises(ValueError, match="Unknown character class"):
+        newSecureStrings(1, 16, require=("emoji",))
+    with pytest.raises(ValueError, match="bits"):
+        newSecureStrings(1, 8, minEntropy=128)
+
+def test_count_returns_distinct_passwords():
+    result = CliRunner().invoke(app, ["genpass", "--count", "300", "--length", "20", "--require", "digit"])
+    assert result.exit_code == 0, result.output
+    passwords = result.output.splitlines()
+    assert len(passwords) == 300
+    assert len(set(passwords)) == 300
+    assert all(len(password) == 20 and set(password) & set(string.digits) for password in passwords)
+
+def test_iter_secure_strings_spans_batches():
+    generator = passgen.iterSecureStrings(12)
+    passwords = [next(generator) for _ in range(passgen.BATCH_SIZE + 10)]
+    assert len(set(passwords)) == len(passwords)
+    assert all(len(password) == 12 for password in passwords)
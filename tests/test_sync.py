@@ -0,0 +1,48 @@
+import json, shutil
+from keybin import core
+from keybin.sync import syncWith
+from conftest import sessionFernet, readCopy
+
+
+def _services(logFile):
+    return sorted(log.service for log in logFile.logs.values())
+
+def test_sync_round_trip_with_tombstones(profile, home):
+    path = profile(key="masterkey")
+    for service in ("GitHub", "Gitlab", "Google"):
+        core.newLog(service, "jota", None, "pw", None)
+    other = home / "usb.kbv"
+    shutil.copy(path, other)
+    assert syncWith(other) == ((0, 0), (0, 0))
+
+    core.deleteLog(2, True)
+    remote = readCopy(other)
+    entries = [core.insertLog(remote, "Gmail", "jota", None, "pw", None, save=False)]
+    entries = [{"op" : "add", "log" : entries[0]}, core.removeLog(remote, 3, save=False)]
+    core.commitChanges(other, core.getUserProfile("test").model_copy(update={"data_path" : str(other)}), sessionFernet(), remote, entries)
+
+    assert syncWith(other) == ((1, 1), (0, 1))
+    local, remote = core.getLogFile(), readCopy(other)
+    assert _services(local) == _services(remote) == ["GitHub", "Gmail"]
+    assert {log.uid for log in local.logs.values()} == {log.uid for log in remote.logs.values()}
+    assert len(local.tombstones) == len(remote.tombstones) == 2
+
+    ## en el segundo sync los dos ya guardaron los borrados, los tombstones se descartan
+    assert syncWith(other) == ((0, 0), (0, 0))
+    local, remote = core.getLogFile(), readCopy(other)
+    assert local.tombstones == remote.tombstones == {}
+    assert syncWith(other) == ((0, 0), (0, 0))
+    assert _services(core.getLogFile()) == _services(readCopy(other)) == ["GitHub", "Gmail"]
+
+def test_dry_run_writes_nothing(profile, home):
+    profile()
+    core.newLog("GitHub", "jota", None, "pw", None)
+    other = home / "old.kbv"
+    other.write_text(json.dumps({"currentLogId" : 1, "logs" : {"1" : {"logID" : 1, "service" : "Google", "user" : None, "email" : None,
+                                                                    "password" : "pw", "tags" : None, "createdAt" : "2024-01-01T00:00:00+00:00"}}}))
+    before = other.read_bytes()
+    localBefore = core.getActivePath().read_bytes()
+
+    assert syncWith(other, dryRun=True) == ((1, 0), (1, 0))
+    assert other.read_bytes() == before
+    assert core.getActivePath().read_bytes() == localBefore
@@ -0,0 +1,108 @@
+import pytest
+from typer.testing import CliRunner
+from keybin import core, transfer
+from keybin.cli import app
+
+ORIGINALS = [
+    ("GitHub", "jota", "j@x.com", "secret1", ["dev", "work"]),
+    ("Gitlab", None, "k@x.com", "p,with \"quotes\"", ["dev"]),
+    ("Google", "other", None, "secret3", None),
+    ("Bank", "me", None, "s3cret", None),
+]
+
+
+def _fields(logs):
+    return sorted((log.service, log.user, log.email, log.password, log.tags) for log in logs)
+
+@pytest.fixture
+def runner(monkeypatch):
+    monkeypatch.setattr(transfer, "ARCHIVE_ITERATIONS", 1000) ## el kdf del archive no es lo que se prueba
+    return CliRunner()
+
+@pytest.mark.parametrize("encrypt", [False, True])
+@pytest.mark.parametrize("format", ["csv", "jsonl"])
+def test_export_import_round_trip(profile, home, runner, format, encrypt):
+    profile("source", key="masterkey")
+    for log in ORIGINALS:
+        core.newLog(*log)
+    output = home / f"export.{format}"
+    extra = ["--encrypt", "--passphrase", "archive pass"] if encrypt else []
+
+    result = runner.invoke(app, ["log", "export", "--format", format, "-o", str(output), *extra])
+    assert result.exit_code == 0, result.output
+    assert f"{len(ORIGINALS)} logs exported" in result.output
+
+    profile("target", key="otherkey")
+    result = runner.invoke(app, ["log", "import", str(output), *(["--passphrase", "archive pass"] if encrypt else [])])
+    assert result.exit_code == 0, result.output
+    assert f"{len(ORIGINALS)} logs imported, 0 rows skipped." in result.output
+    assert _fields(core.revealLog(log) for log in core.doSearch("all")) == sorted(ORIGINALS)
+
+@pytest.mark.parametrize("encrypt", [False, True])
+@pytest.mark.parametrize("format", ["csv", "jsonl"])
+def test_empty_export(profile, home, runner, format, encrypt):
+    profile("source", key="masterkey")
+    core.newLog("GitHub", "jota", None, "pw", None)
+    output = home / f"export.{format}"
+    extra = ["--encrypt", "--passphrase", "archive pass"] if encrypt else []
+
+    result = runner.invoke(app, ["log", "export", "missing", "--format", format, "-o", str(output), *extra])
+    assert result.exit_code == 0, result.output
+    assert "0 logs exported" in result.output
+    if format == "csv" and not encrypt:
+        assert output.read_text() == ",".join(transfer.EXPORT_FIELDS) + "\n"
+
+    result = runner.invoke(app, ["log", "import", str(output), *(["--passphrase", "archive pass"] if encrypt else [])])
+    assert result.exit_code == 0, result.output
+    assert "0 logs imported, 0 rows skipped." in result.output
+
+
+def _imported(text : str, format : str = "auto"):
+    return list(transfer.iterImport(text.splitlines(keepends=True), format))
+
+def test_import_detects_chrome_csv():
+    rows = _imported("name,url,username,password\nGitHub,https://github.com,jota,pw1\nGmail,https://mail.google.com,j@x.com,pw2\n")
+    assert [(number, log.service, log.user, log.email, log.password) for number, log, error in rows] == [
+        (2, "GitHub", "jota", None, "pw1"),
+        (3, "Gmail", None, "j@x.com", "pw2"),
+    ]
+
+def test_import_detects_bitwarden_csv():
+    rows = _imported("folder,favorite,type,name,notes,fields,login_uri,login_username,login_password,login_totp\n"
+                     "work,,login,GitHub,,,https://github.com,jota,pw1,\n"
+                     ",,login,Bank,,,,me@bank.com,pw2,\n")
+    assert [(log.service, log.user, log.email, log.password, log.tags) for number, log, error in rows] == [
+        ("GitHub", "jota", None, "pw1", ["work"]),
+        ("Bank", None, "me@bank.com", "pw2", None),
+    ]
+
+def test_import_reads_keybin_csv():
+    rows = _imported("logID,service,user,email,password,tags,createdAt\n7,GitHub,jota,j@x.com,pw,\"dev,work\",2024-01-01T00:00:00+00:00\n")
+    (number, log, error), = rows
+    assert (log.service, log.user, log.email, log.password, log.tags) == ("GitHub", "jota", "j@x.com", "pw", ["dev", "work"])
+    assert error is None
+
+def test_import_reports_bad_rows():
+    rows = _imported("service,user,email,password,tags\nGitHub,jota,,pw,\n,,,orphan,\n\nGitlab,jota,,pw,dev\n")
+    assert [(number, log.service if log else None, error) for number, log, error in rows] == [
+        (2, "GitHub", None),
+        (3, None, "needs at least a service, user or email"),
+        (5, "Gitlab", None),
+    ]
+    rows = _imported('{"service" : "GitHub"}\n[1, 2]\nnot json\n{"user" : "jota"}\n')
+    assert [(number, error is None) for number, log, error in rows] == [(1, True), (2, False), (3, False), (4, True)]
+    assert rows[1][2] == "expected a JSON object"
+
+def test_import_rejects_unknown_layouts():
+    with pytest.raises(ValueError, match="detect the CSV layout"):
+        _imported("foo,bar\n1,2\n")
+    with pytest.raises(ValueError, match="Unknown import format"):
+        _imported("service\nGitHub\n", "keepass")
+
+def test_import_file_that_cant_be_opened(profile, home, runner):
+    profile()
+    result = runner.invoke(app, ["log", "import", str(home / "missing.csv")])
+    assert result.exit_code == 0
+    assert result.output == f"ERROR: Couldn't open {home / 'missing.csv'}: No such file or directory.\n"
+    result = runner.invoke(app, ["log", "import", str(home)])
+    assert "Is a directory" in result.output
@@ -0,0 +1,69 @@
+import json, struct, zlib
+import pytest
+from keybin import core
+from keybin.columns import LogColumns
+from keybin.vaultfile import VAULT_VERSION, isVaultFile, legacyUid
+from conftest import sessionFernet
+
+CREATED = "2024-01-01T00:00:00+00:00"
+LEGACY_VAULT = {
+    "currentLogId" : 2,
+    "logs" : {
+        "1" : {"logID" : 1, "service" : "GitHub", "user" : "jota", "email" : "j@x.com", "password" : "secret1", "tags" : ["dev"], "createdAt" : CREATED},
+        "2" : {"logID" : 2, "service" : "Google", "user" : "other", "email" : None, "password" : "secret2", "tags" : None, "createdAt" : CREATED},
+    },
+}
+
+
+@pytest.mark.parametrize("key", [None, "masterkey"])
+def test_legacy_vault_is_migrated(profile, key):
+    path = profile(key=key)
+    f = sessionFernet()
+    data = json.dumps(LEGACY_VAULT, indent=4).encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(f.encrypt(data) if f else data)
+
+    logFile = core.getLogFile()
+    assert sorted(logFile.logs) == [1, 2]
+    assert logFile.currentLogId == 2
+    log = core.revealLog(logFile.logs[1], f) if f else logFile.logs[1]
+    assert (log.service, log.user, log.password, log.tags) == ("GitHub", "jota", "secret1", ["dev"])
+    assert log.uid == legacyUid(1, "GitHub", "jota", "j@x.com", CREATED)
+
+    data = path.read_bytes()
+    assert isVaultFile(data) and data[3] == VAULT_VERSION
+    again = core.getLogFile()
+    assert {log.uid for log in again.logs.values()} == {log.uid for log in logFile.logs.values()}
+
+def test_version_3_vault_gets_sync_metadata(profile):
+    path = profile()
+    columns = {"logID" : [1], "service" : ["GitHub"], "user" : ["jota"], "email" : [None], "tags" : [["dev"]],
+               "createdAt" : [CREATED], "password" : ["secret"], "currentLogId" : 1}
+    body = zlib.compress(json.dumps(columns).encode("utf-8"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"KBV" + bytes((3, 0)) + struct.pack(">Q", 7) + struct.pack(">I", len(body)) + body)
+
+    log = core.getLogFile().logs[1]
+    assert (log.uid, log.version, log.updatedAt) == (legacyUid(1, "GitHub", "jota", None, CREATED), 1, CREATED)
+
+    core.newLog("Gitlab", "jota", None, "secret2", None)
+    assert path.read_bytes()[3] == VAULT_VERSION
+    logs = core.getLogFile().logs
+    assert sorted(logs) == [1, 2]
+    assert logs[1].uid == log.uid
+
+@pytest.mark.parametrize("storage", ["file", "journal"])
+def test_saved_indexes_follow_changes(profile, storage):
+    profile(key="masterkey", storage=storage)
+    for number in range(40):
+        core.newLog(f"service{number % 7}", f"user{number % 5}", None, "pw", ["dev"] if number % 2 else ["work", "dev"])
+    core.saveLogFile(core.getLogFile()) ## el indice queda en el snapshot, lo que sigue va al journal
+    for logID in (3, 4, 17):
+        core.deleteLog(logID, True)
+    core.newLog("service2", "user9", None, "pw", ["new"])
+
+    logFile = core.getLogFile()
+    assert logFile._savedIndexes is not None
+    columns = LogColumns.fromLogs(logFile.logs)
+    for query in ({"service" : "service2"}, {"user" : "user9"}, {"tags" : ["dev"]}, {"service" : "service3", "tags" : ["work"]}, {"tags" : ["new"]}, {"service" : "missing"}):
+        assert logFile._savedIndexes.lookup(logFile.logs, **query) == columns.filterIds(**query), query